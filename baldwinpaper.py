@@ -39,15 +39,31 @@ from optparse import OptionParser
 
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blackjack import engine
+from blackjack.profile import Profile
+
 
 def main(argv):
     optparser = OptionParser("usage: %prog [options] strategy")
     optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
     optparser.add_option("-e", action="store_true", dest="error", default=False, help="print error tables")
+    optparser.add_option("-r", "--recursive", action="store_true", dest="recursive", default=False, help="build conditional total tables by recursive enumeration instead of a Markov chain (default if NumPy is not installed)")
+    optparser.add_option("--profile", action="store", type="string", dest="profile", default="", help="write a JSON profile report (call counts, seconds by phase and dealer face up card) to a file and print a summary")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
     (opts, args) = optparser.parse_args()
 
     if opts.verbose:
         print("verbose:",opts.verbose)
+        print("recursive:",opts.recursive)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("profile:",opts.profile)
         print("args:",args)
     
     # Some notation will facilitate the description of the optimum strategy for drawing.
@@ -151,9 +167,21 @@ def main(argv):
     # utility functions
     
     cards =      [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    deckCounts = [4, 4, 4, 4, 4, 4, 4, 4, 4, 16]
+    deckCounts = [4*opts.decks for c in range(9)] + [16*opts.decks]
+    if opts.shoe:
+        try:
+            deckCounts = [int(n) for n in opts.shoe.split(",")]
+        except ValueError:
+            optparser.error("shoe counts must be integers")
+        if len(deckCounts) != len(cards) or min(deckCounts) < 0:
+            optparser.error("shoe must have 10 non-negative counts (A,2,...,9,10)")
+    elif opts.decks < 1:
+        optparser.error("number of decks must be at least 1")
     deckCountTotal = sum(deckCounts)
 
+    # hot path counters and timers (only installed with --profile)
+    profile = Profile("baldwinpaper.py", bool(opts.profile))
+
     # number of times card c appears in hand h
     def cardCount(hand, c):
         n = 0
@@ -177,10 +205,12 @@ def main(argv):
         return t,a
 
     # probability of drawing a card given a set of already dealt cards
+    @profile.counted
     def drawProb1(dealt, c):
         return (deckCounts[c-1]-cardCount(dealt,c))/(deckCountTotal-len(dealt))
         
     # probability of drawing a sequence of cards given a set of already dealt cards
+    @profile.counted
     def drawProb(dealt, hand):
         p = 1.0
         for i in range(len(hand)):
@@ -197,6 +227,7 @@ def main(argv):
     # dealer to stand on two cards, the probabilities for the totals thus obtained
     # were included with the three-card probabilities.
 
+    profile.phase("dealer three card probabilities")
     dealer3TotalProbs = [[[0 for t in range(23)] for a in range(2)] for dfu in cards]
     for dfu in cards:
         for d2 in cards:
@@ -223,8 +254,26 @@ def main(argv):
     # of drawing any card in the deck is 1/52 ("equiprobability"); and (2) no
     # matter how many cards the player draws, the probability of receiving any
     # particular card on the next draw is still 1/52 ("sampling with replacement").
+    #
+    # Under these assumptions drawing is an absorbing Markov chain over the partial totals,
+    # so the tables for every starting total can be computed at once with one linear solve
+    # instead of enumerating every draw path (the recursive enumeration is kept for when
+    # NumPy isn't available).
+
+    useChain = np is not None and not opts.recursive
 
+    # conditional probabilities of final totals (busts are stored in 0) given a partial total,
+    # for a hand that draws from an infinite deck until stands(t,a) is true (solved by the
+    # package, shared with BaldwinEngine)
+    #
+    # Returns probs with probs[a][t] = final total probabilities for partial total t,a.
+    @profile.counted
+    def absorbingTotalProbs(stands):
+        return engine.absorbingTotalProbs(stands, drawProb1)
+
+    profile.phase("dealer conditional probabilities")
     dealerCTotalProbs = [[[[0 for t in range(23)] for t1 in range(22)] for a1 in [0,1]] for dfu in cards]
+    @profile.counted
     def buildDTP2(dfu, t1, a1, t, a, p):
         if t > 21:
             dealerCTotalProbs[dfu-1][a1][t1][0] += p
@@ -244,15 +293,22 @@ def main(argv):
                 buildDTP2(dfu, t1, a1, tc, ac, pc*p)
     def buildDTP(dfu, t1, a1):
         buildDTP2(dfu, t1, a1, t1, a1, 1.0)
+    if useChain:
+        # the dealer's drawing rule doesn't depend on the up card, so one chain serves them all
+        dtp = absorbingTotalProbs(lambda t, a: t >= 17)
     for dfu in cards:
         for a1 in range(2):
             for t1 in range((5 if a1 == 0 else 13),17):
-                buildDTP(dfu, t1, a1)
+                if useChain:
+                    dealerCTotalProbs[dfu-1][a1][t1] = dtp[a1][t1] + [0]
+                else:
+                    buildDTP(dfu, t1, a1)
 
     # In the third stage the results from the previous stages are combined yielding
     # the following approximation for P(T = t) for t >= 17.
     # P(T = t) = P(T3 = t) + sum for j<17 of P(T3 = j)P(T = t/Tp = j)
 
+    profile.phase("dealer total probabilities")
     dealerTotalProbs = [[0 for t in range(23)] for dfu in cards]
     for dfu in cards:
         dealerTotalProbs[dfu-1][0] = dealer3TotalProbs[dfu-1][0][0]
@@ -303,7 +359,9 @@ def main(argv):
     # D = 7, 8, (1, 11) where M(D) = 17 and M*(D) = 19;
     # and D = 9, 10 where M(D) = 17 and M*(D) = 19.
 
+    profile.phase("player conditional probabilities")
     playerCTotalProbs = [[[[0 for tm in range(22)] for th in range(22)] for ah in [0,1]] for dfu in cards]
+    @profile.counted
     def buildPTP2(dfu, th, ah, t, a, p):
         if t > 21:
             playerCTotalProbs[dfu-1][ah][th][0] += p
@@ -323,10 +381,18 @@ def main(argv):
                 buildPTP2(dfu, th, ah, tc, ac, pc*p)
     def buildPTP(dfu, th, ah):
         buildPTP2(dfu, th, ah, th, ah, 1.0)
+    # one chain per distinct pair of minimum standing numbers M(D),M*(D)
+    ptps = {}
     for dfu in cards:
+        m = (M_D(dfu, 0), M_D(dfu, 1))
+        if useChain and m not in ptps:
+            ptps[m] = absorbingTotalProbs(lambda t, a: t >= m[a])
         for ah in range(2):
             for th in range((5 if ah == 0 else 13),22):
-                buildPTP(dfu, th, ah)
+                if useChain:
+                    playerCTotalProbs[dfu-1][ah][th] = ptps[m][ah][th]
+                else:
+                    buildPTP(dfu, th, ah)
     if opts.verbose:
         print("\nplayer conditional total probabilities bust(0) 1 to 21")
         for dfu in cards:
@@ -367,6 +433,7 @@ def main(argv):
     # In the last two sums it is understood that the hole cards do not form a natural or a
     # pair of y's with y in Y(D).
 
+    profile.phase("player hole card probabilities")
     probPlayerNatural = [0 for dfu in cards]
     for dfu in cards:
         probPlayerNatural[dfu-1] = drawProb([dfu], [1, 10]) + drawProb([dfu], [10, 1])
@@ -558,9 +625,11 @@ def main(argv):
     expectedWinnings = [0 for dfu in cards]
     ew = 0.0
     for dfu in cards:
+        profile.phase("expected winnings", dfu)
         expectedWinnings[dfu-1] = ew_D(dfu)
         ew += expectedWinnings[dfu-1]*deckCounts[dfu-1]/deckCountTotal
     
+    profile.phase("output")
     print("expected winnings")
     for dfu in cards:
         print(dfu,expectedWinnings[dfu-1])
@@ -693,5 +762,8 @@ def main(argv):
         printEWTable(expectedWinnings_err, expectedWinnings_paper_cols, False)
         print(f"Overall {ew_err:.3f}")
 
+    if profile.enabled:
+        profile.save(opts.profile)
+
 if __name__ == '__main__':
     main(sys.argv)
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import sys
+from optparse import OptionParser
+
+import os
+import io
+import json
+import time
+import resource
+import runpy
+import multiprocessing
+
+
+# calculators and the strategies they are benchmarked with
+calculators = ["baldwinpaper.py", "ewcalc.py", "ewcalc2.py"]
+strategies = ["baldwin-optimum", "culbertson", "mimicdealer"]
+
+# calculators that can be run for a single dealer face up card (-d), the others are run once for
+# all of them
+perCardCalculators = ["ewcalc.py", "ewcalc2.py"]
+
+# functions counted as hand expansions (memoized functions only count the expansions that miss
+# the cache, and DependentEngine's are its underscored methods) and as card draw probability
+# calculations
+handFunctions = ["buildDTP2", "buildPTP2", "expandDealerHand", "expandPlayerHand", "dealerTotalProbs", "playerEW", "splitHandsEW", "_dealerTotalProbs", "_playerEW", "_splitHandsEW"]
+drawFunctions = ["drawProb", "drawProb1", "draw", "drawOther"]
+
+# shoe the calculators are run with (their default single deck), for weighting the expected
+# winnings by dealer face up card
+deckCounts = [4 for c in range(9)] + [16]
+
+# expected winnings published in README.md by calculator and strategy, for dealer face up cards
+# 2,...,10,A and overall
+readmeExpectedWinnings = {
+    ("baldwinpaper.py", "baldwin-optimum"): ([0.0949, 0.1255, 0.1681, 0.2138, 0.2256, 0.1462, 0.0580, -0.0368, -0.1694, -0.3599], -0.0033),
+    ("baldwinpaper.py", "culbertson"): ([0.0731, 0.0981, 0.1275, 0.1621, 0.1775, 0.1246, 0.0442, -0.0458, -0.1716, -0.3710], -0.0228),
+    ("baldwinpaper.py", "mimicdealer"): ([0.0161, 0.0304, 0.0473, 0.0707, 0.0955, 0.1231, 0.0376, -0.0563, -0.1833, -0.3656], -0.0565),
+    ("ewcalc.py", "baldwin-optimum"): ([0.0946, 0.1298, 0.1758, 0.2295, 0.2366, 0.1455, 0.0556, -0.0404, -0.1731, -0.3658], -0.0024),
+    ("ewcalc2.py", "baldwin-optimum"): ([0.1011, 0.1375, 0.1832, 0.2375, 0.2423, 0.1465, 0.0546, -0.0438, -0.1715, -0.3617], 0.0009),
+    ("ewcalc2.py", "culbertson"): ([0.0727, 0.1008, 0.1329, 0.1685, 0.1782, 0.1156, 0.0334, -0.0563, -0.1760, -0.3734], -0.0255),
+    ("ewcalc2.py", "mimicdealer"): ([0.0156, 0.0281, 0.0446, 0.0661, 0.0912, 0.1218, 0.0362, -0.0579, -0.1799, -0.3651], -0.0568),
+}
+
+
+# run calculator script with args in this process, sending its output, wall time, peak RSS and
+# call counts (if counting) back through conn
+#
+# The process is a fresh interpreter (spawned, not forked), so its peak RSS is the calculator's
+# and not the benchmark's as well.
+def runCalculator(conn, script, args, counting):
+    calls = {}
+    def profile(frame, event, arg):
+        if event == "call":
+            name = frame.f_code.co_name
+            if name in calls:
+                calls[name] += 1
+    if counting:
+        for name in handFunctions + drawFunctions:
+            calls[name] = 0
+    sys.argv = [script] + args
+    sys.stdout = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        if counting:
+            sys.setprofile(profile)
+        runpy.run_path(script, run_name="__main__")
+    except BaseException as e:
+        error = repr(e)
+    finally:
+        sys.setprofile(None)
+    seconds = time.perf_counter() - start
+    conn.send((sys.stdout.getvalue(), error, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, calls))
+    conn.close()
+
+# output, error, wall time, peak RSS and call counts for a run of calculator script with args in
+# a fresh process
+def measure(script, args, counting):
+    ctx = multiprocessing.get_context("spawn")
+    recv,send = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=runCalculator, args=(send, script, args, counting))
+    proc.start()
+    result = recv.recv()
+    proc.join()
+    return result
+
+# seconds for a fixed pure Python workload (the dictionary and tuple work the calculators do most
+# of), the fastest of five runs
+#
+# Wall times are compared against the baseline in proportion to it, so that a baseline recorded on
+# a faster or slower machine (or the same machine at a busier time, which can be twice as slow from
+# one minute to the next) still applies.
+def calibrate():
+    best = None
+    for run in range(5):
+        start = time.perf_counter()
+        table = {}
+        for i in range(300000):
+            key = (i % 10, i % 7, i % 3)
+            table[key] = table.get(key, 0.0) + i/7
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+# expected winnings by dealer face up card and overall from calculator output (overall is None
+# if it isn't printed)
+def parseExpectedWinnings(output):
+    ews = {}
+    overall = None
+    lines = output.splitlines()
+    for i in range(len(lines)):
+        if lines[i].startswith("overall expected winnings") and i+1 < len(lines):
+            overall = float(lines[i+1])
+        elif lines[i].startswith("expected winnings"):
+            for line in lines[i+1:]:
+                f = line.split()
+                if len(f) != 2 or not f[0].isdigit():
+                    break
+                ews[int(f[0])] = float(f[1])
+    return ews, overall
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [calculator ...]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-b", "--baseline", action="store", type="string", dest="baseline", default="benchmark.json", help="baseline file (default benchmark.json)")
+    optparser.add_option("-r", "--record", action="store_true", dest="record", default=False, help="record a new baseline instead of comparing against the existing one")
+    optparser.add_option("-t", "--threshold", action="store", type="float", dest="threshold", default=0.5, help="relative increase in wall time or peak RSS flagged as a regression (default 0.5)")
+    optparser.add_option("--repeat", action="store", type="int", dest="repeat", default=3, help="number of timed runs of each calculator, keeping the fastest (default 3)")
+    optparser.add_option("-s", "--strategy", action="append", dest="strategies", default=[], help="strategy to benchmark (may be repeated, default all)")
+    optparser.add_option("--api-calls", action="store", type="int", dest="apiCalls", default=300, help="number of warm calls timed for the library API latency (default 300, 0 to skip)")
+    optparser.add_option("--api-limit", action="store", type="float", dest="apiLimit", default=10.0, help="amortized library API latency in milliseconds flagged as a failure (default 10)")
+    optparser.add_option("--no-counts", action="store_false", dest="counting", default=True, help="don't count hand expansions and draw probability calculations (they need a second, slower run)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("baseline:",opts.baseline)
+        print("record:",opts.record)
+        print("threshold:",opts.threshold)
+        print("repeat:",opts.repeat)
+        print("strategies:",opts.strategies)
+        print("apiCalls:",opts.apiCalls)
+        print("apiLimit:",opts.apiLimit)
+        print("counting:",opts.counting)
+        print("args:",args)
+
+    if opts.repeat < 1:
+        optparser.error("--repeat must be at least 1")
+    scripts = args if args else calculators
+    for script in scripts:
+        if script not in calculators:
+            optparser.error("unknown calculator "+script)
+    for strategy in opts.strategies:
+        if strategy not in strategies:
+            optparser.error("unknown strategy "+strategy)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    baseline = {}
+    baselineCalibration = None
+    if not opts.record:
+        try:
+            with open(opts.baseline) as f:
+                recorded = json.load(f)
+            baseline = recorded["results"]
+            baselineCalibration = recorded.get("calibration")
+        except FileNotFoundError:
+            print("no baseline in",opts.baseline,"recording a new one")
+            opts.record = True
+
+    # calibrated before the runs (and again before a slow run is retimed)
+    calibration = calibrate()
+
+    # relative increase in wall time key of result over old, in proportion to the calibrations
+    # (taken as is from a baseline recorded without one)
+    def slowdown(result, old, key):
+        scale = calibration/baselineCalibration if baselineCalibration else 1.0
+        return result[key]/(scale*old[key]) - 1
+
+    # benchmark runs
+    #
+    # Each run is timed in a fresh process without the profiler, then repeated with it to count
+    # calls, since counting slows the run down too much to time it at the same time. The fastest
+    # of --repeat timed runs is kept, since runs of a fraction of a second can vary by a third from
+    # one to the next. The counts don't vary at all, so they are the exact check on regressions
+    # and the wall times a coarse one.
+
+    results = {}
+    failures = []
+    print("calculator strategy dfu seconds maxrss(KB) hands draws status")
+    for script in scripts:
+        for strategy in (opts.strategies if opts.strategies else strategies):
+            runs = [[d] for d in range(1, 11)] if script in perCardCalculators else [[]]
+            ews = {}
+            overall = None
+            for run in runs:
+                args = ["-d", str(run[0])] if run else []
+                name = " ".join([script, strategy] + [str(d) for d in run])
+                output,error,seconds,maxrss,calls = measure(os.path.join(here, script), args+[strategy], False)
+                for i in range(opts.repeat-1):
+                    if error:
+                        break
+                    seconds = min(seconds, measure(os.path.join(here, script), args+[strategy], False)[2])
+                if error:
+                    failures.append(name+": "+error)
+                    print(name, "failed:", error)
+                    continue
+                if opts.counting:
+                    calls = measure(os.path.join(here, script), args+[strategy], True)[4]
+                e,o = parseExpectedWinnings(output)
+                ews.update(e)
+                if o is not None:
+                    overall = o
+                result = {
+                    "seconds": seconds,
+                    "maxrss": maxrss,
+                    "hands": sum(calls.get(f, 0) for f in handFunctions) if opts.counting else None,
+                    "draws": sum(calls.get(f, 0) for f in drawFunctions) if opts.counting else None,
+                    "calls": {f: n for f,n in calls.items() if n > 0},
+                    "ew": e,
+                }
+                results[name] = result
+
+                # regressions against the baseline
+                status = []
+                old = baseline.get(name)
+                if old and slowdown(result, old, "seconds") > opts.threshold:
+                    # the machine can slow down by half for a minute at a time, so a slow run is
+                    # timed again against a fresh calibration before it's flagged
+                    calibration = calibrate()
+                    seconds = min(measure(os.path.join(here, script), args+[strategy], False)[2] for i in range(opts.repeat))
+                    result["seconds"] = seconds
+                if old:
+                    if slowdown(result, old, "seconds") > opts.threshold:
+                        status.append("seconds +"+str(round(100*slowdown(result, old, "seconds")))+"%")
+                    if result["maxrss"] > old["maxrss"]*(1+opts.threshold):
+                        status.append("maxrss +"+str(round(100*(result["maxrss"]/old["maxrss"]-1)))+"%")
+                    for key in ["hands", "draws"]:
+                        if result[key] is not None and old.get(key) is not None and result[key] > old[key]:
+                            status.append(key+" +"+str(result[key]-old[key]))
+                    if status:
+                        failures.append(name+": "+", ".join(status))
+                print(name if run else name+" all", round(seconds, 3), maxrss, result["hands"], result["draws"], ", ".join(status) if status else "ok")
+                if opts.verbose:
+                    print("calls:",result["calls"])
+
+            # expected winnings against the README tables
+            published = readmeExpectedWinnings.get((script, strategy))
+            if published and len(ews) == 10:
+                if overall is None:
+                    # per card runs don't print the overall value, combine them like the calculators do
+                    overall = sum(ews[d]*deckCounts[d-1] for d in range(1, 11))/sum(deckCounts)
+                labels = [str(d) for d in range(1, 11)] + ["overall"]
+                values = [ews[d] for d in range(1, 11)] + [overall]
+                expected = [published[0][(d-2)%10] for d in range(1, 11)] + [published[1]]
+                for label,ew,p in zip(labels, values, expected):
+                    if abs(ew - p) > 0.00005 + 1e-12:
+                        failure = script+" "+strategy+" "+label+": expected winnings "+str(ew)+" don't match README "+str(p)
+                        failures.append(failure)
+                        print(failure)
+
+    # library API
+    #
+    # The Baldwin-style engine is built once and then evaluates the strategies in turn, so after
+    # the first call every evaluation should only cost a few milliseconds.
+    if opts.apiCalls > 0:
+        # imported here so the calculator runs don't start with NumPy loaded (their spawned
+        # processes import this module again)
+        from blackjack import Rules, Shoe, Strategy, BaldwinEngine
+        print("\napi engine seconds(first) milliseconds(amortized) status")
+        # the strategy charts are loaded before the timing starts, so only evaluations are timed
+        names = opts.strategies if opts.strategies else strategies
+        charts = [Strategy.builtin(strategy) for strategy in names]
+        start = time.perf_counter()
+        engine = BaldwinEngine(Rules(), Shoe.decks(1))
+        evaluations = [engine.evaluate(strategy) for strategy in charts]
+        first = time.perf_counter() - start
+        amortized = None
+        for run in range(opts.repeat):
+            start = time.perf_counter()
+            for i in range(opts.apiCalls):
+                engine.evaluate(charts[i%len(charts)])
+            ms = 1000*(time.perf_counter() - start)/opts.apiCalls
+            amortized = ms if amortized is None else min(amortized, ms)
+        name = "api BaldwinEngine"
+        result = {"seconds": first, "amortized": amortized}
+        results[name] = result
+        status = []
+        if amortized > opts.apiLimit:
+            status.append("amortized over "+str(opts.apiLimit)+"ms")
+        old = baseline.get(name)
+        if old and slowdown(result, old, "amortized") > opts.threshold:
+            status.append("amortized +"+str(round(100*slowdown(result, old, "amortized")))+"%")
+        if status:
+            failures.append(name+": "+", ".join(status))
+        print(name, round(first, 3), round(amortized, 3), ", ".join(status) if status else "ok")
+        # the engine has to give the same results as the script
+        for evaluation in evaluations:
+            published = readmeExpectedWinnings.get(("baldwinpaper.py", evaluation.strategy.name))
+            ews = evaluation.byDfu[1:] + evaluation.byDfu[:1]
+            for label,ew,p in zip([str(d) for d in range(2, 11)] + ["1", "overall"], ews + [evaluation.overall], published[0] + [published[1]]):
+                if abs(ew - p) > 0.00005 + 1e-12:
+                    failure = name+" "+evaluation.strategy.name+" "+label+": expected winnings "+str(ew)+" don't match README "+str(p)
+                    failures.append(failure)
+                    print(failure)
+
+    if opts.record:
+        with open(opts.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "calibration": calibration, "results": results}, f, indent=1, sort_keys=True)
+        print("recorded baseline in",opts.baseline)
+
+    if failures:
+        print("\nfailures")
+        for failure in failures:
+            print(failure)
+        sys.exit(1)
+    print("\nall benchmarks ok")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,41 @@
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# Python API for the blackjack calculations
+#
+# The command line scripts (baldwinpaper.py, ewcalc.py, ewcalc2.py) build everything they need
+# for a single run. The objects here can be imported instead, and an engine keeps its dealer and
+# player tables between calls, so evaluating one strategy after another is cheap:
+#
+#   from blackjack import Rules, Shoe, Strategy, BaldwinEngine
+#   engine = BaldwinEngine(Rules(), Shoe.decks(1))
+#   for name in Strategy.builtins:
+#       print(name, engine.evaluate(Strategy.builtin(name)).overall)
+
+from blackjack.hand import cards, addCard, removeCard, Hand
+from blackjack.rules import Rules
+from blackjack.shoe import Shoe
+from blackjack.strategy import Strategy
+from blackjack.engine import Engine, Evaluation, BaldwinEngine, DependentEngine
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import sqlite3
+import json
+
+
+# version of the cached calculations, bump it whenever a change to the calculators changes the
+# values they store (entries from other versions are deleted when the cache is opened)
+cacheVersion = 1
+
+
+# persistent cache of dealer final total probabilities in an SQLite file
+#
+# Dealer total probabilities depend only on the rules and the composition of the shoe, so they can
+# be reused by later runs, by runs for other dealer face up cards (-d) and by runs with other
+# strategies. Entries are stored per calculator (kind, since the calculators store different
+# tables), rules and starting shoe, and all of the entries for a run are loaded when it starts.
+# New entries are kept in memory until they are flushed. The file is only opened while loading
+# and flushing, so a cache can be carried into forked worker processes that flush on their own.
+#
+# path: SQLite file
+# kind: name of the table stored by the calculator
+# rules: description of every rule the stored values depend on
+# shoe: starting shoe counts
+class DealerCache:
+    def __init__(self, path, kind, rules, shoe):
+        self.kind = kind
+        self.rules = rules
+        self.shoe = ",".join(str(n) for n in shoe)
+        self.path = path
+        self.entries = {}
+        self.new = {}
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS dealer (version INTEGER, kind TEXT, rules TEXT, shoe TEXT, key TEXT, value TEXT, PRIMARY KEY (version, kind, rules, shoe, key))")
+            db.execute("DELETE FROM dealer WHERE version != ?", (cacheVersion,))
+            db.commit()
+            for key,value in db.execute("SELECT key, value FROM dealer WHERE version = ? AND kind = ? AND rules = ? AND shoe = ?", (cacheVersion, self.kind, self.rules, self.shoe)):
+                self.entries[key] = json.loads(value)
+        finally:
+            db.close()
+        self.loaded = len(self.entries)
+
+    # cached value for key (a tuple of integers), or None
+    def get(self, key):
+        return self.entries.get(",".join(str(k) for k in key))
+
+    # cache value (a list of numbers, stored exactly) for key
+    def put(self, key, value):
+        key = ",".join(str(k) for k in key)
+        self.entries[key] = value
+        self.new[key] = value
+
+    # write new entries to the file
+    def flush(self):
+        if not self.new:
+            return
+        db = sqlite3.connect(self.path, timeout=60)
+        try:
+            db.executemany("INSERT OR IGNORE INTO dealer VALUES (?, ?, ?, ?, ?, ?)", [(cacheVersion, self.kind, self.rules, self.shoe, key, json.dumps(value)) for key,value in self.new.items()])
+            db.commit()
+        finally:
+            db.close()
+        self.new = {}
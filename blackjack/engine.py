@@ -0,0 +1,659 @@
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import functools
+import collections
+import copy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blackjack.hand import cards, addCard, removeCard, Hand
+from blackjack.rules import Rules
+from blackjack.shoe import Shoe
+from blackjack.dealercache import DealerCache
+
+
+# expected winnings for a strategy
+#
+# byDfu: expected winnings by dealer face up card (index dfu-1, None for face up cards that can't
+# be dealt from the shoe)
+# overall: expected winnings over all dealer face up cards
+class Evaluation:
+    __slots__ = ("strategy", "byDfu", "overall")
+
+    def __init__(self, strategy, byDfu, overall):
+        self.strategy = strategy
+        self.byDfu = byDfu
+        self.overall = overall
+
+    def __repr__(self):
+        return "Evaluation(%r, overall=%r)" % (self.strategy, self.overall)
+
+
+# expected winnings calculator for a set of rules and a shoe
+#
+# Engines build the tables that don't depend on the strategy when they are created and keep the
+# ones that do between calls, so only the first evaluation of a strategy pays for them.
+class Engine:
+    def __init__(self, rules=None, shoe=None):
+        self.rules = rules if rules is not None else Rules()
+        self.shoe = shoe if shoe is not None else Shoe.decks(1)
+
+    # Evaluation of strategy
+    def evaluate(self, strategy):
+        raise NotImplementedError
+
+    # true if strategy doubles down on two card total t,a against dealer face up card dfu (and the
+    # rules allow it)
+    def doubles(self, strategy, dfu, t, a):
+        return t in strategy.X_D(dfu, a) and self.rules.canDouble(t, a)
+
+    # overall expected winnings from the expected winnings by dealer face up card
+    def _overall(self, byDfu):
+        ew = 0.0
+        for dfu in cards:
+            if byDfu[dfu-1] is not None:
+                ew += byDfu[dfu-1]*self.shoe.counts[dfu-1]/self.shoe.total
+        return ew
+
+
+# Baldwin et al.'s approximate calculation (see baldwinpaper.py for the details and the quotes
+# from the paper)
+#
+# The dealer total probabilities, the player's hole card probabilities and the values for
+# standing and doubling down don't depend on the strategy and are built once. The player's
+# conditional total tables are built once for each pair of minimum standing numbers M(D),M*(D).
+#
+# The approximation has no way to follow a hand past its first split or to play a hand against
+# an unknown dealer natural, so surrender, resplitting and no hole card are left to
+# DependentEngine.
+#
+# paper: reproduce baldwinpaper.py, which values a pair of 2's or aces that isn't split at
+# nothing and only counts a soft hand that it hits when it ends on a total of M*(D) or more
+# (that's what gives Cantey's corrected -0.0032). With paper=False those hands are valued from the
+# conditional total tables like any other, with the paper's sum for h >= M, so that comparing
+# strategies (as optimize.py does) isn't skewed by them.
+class BaldwinEngine(Engine):
+    def __init__(self, rules=None, shoe=None, recursive=False, paper=True):
+        Engine.__init__(self, rules, shoe)
+        if self.rules.surrender or self.rules.splitHands > 2 or not self.rules.holeCard:
+            raise ValueError("BaldwinEngine doesn't support surrender, resplitting or no hole card")
+        self.useChain = np is not None and not recursive
+        self.paper = paper
+        stands = self.rules.dealerStands
+        counts = self.shoe.counts
+        total = self.shoe.total
+
+        # probability of drawing a card given a set of already dealt cards
+        def drawProb1(dealt, c):
+            return (counts[c-1]-dealt.count(c))/(total-len(dealt))
+        self._drawProb1 = drawProb1
+
+        # probability of drawing a sequence of cards given a set of already dealt cards
+        def drawProb(dealt, hand):
+            p = 1.0
+            for i in range(len(hand)):
+                p = p*drawProb1(dealt+hand[0:i], hand[i])
+            return p
+
+        # dealer's three card probabilities
+        dealer3TotalProbs = [[[0 for t in range(23)] for a in range(2)] for dfu in cards]
+        for dfu in cards:
+            for d2 in cards:
+                t,a = handTotal([dfu, d2])
+                if not stands(t, a):
+                    for d3 in cards:
+                        t,a = handTotal([dfu, d2, d3])
+                        p = drawProb([dfu], [d2, d3])
+                        if t > 21:
+                            dealer3TotalProbs[dfu-1][a][0] += p
+                        else:
+                            dealer3TotalProbs[dfu-1][a][t] += p
+                else:
+                    p = drawProb([dfu], [d2])
+                    if t == 21:
+                        dealer3TotalProbs[dfu-1][a][22] += p
+                    else:
+                        dealer3TotalProbs[dfu-1][a][t] += p
+
+        # dealer's conditional total probabilities given a partial total
+        dealerCTotalProbs = [[[[0 for t in range(23)] for t1 in range(22)] for a1 in [0,1]] for dfu in cards]
+        dtp = self._conditionalTotalProbs(stands)
+        for dfu in cards:
+            for a1 in range(2):
+                for t1 in range((5 if a1 == 0 else 13),18):
+                    if not stands(t1, a1):
+                        dealerCTotalProbs[dfu-1][a1][t1] = dtp[a1][t1] + [0]
+
+        # dealer total probabilities (busts are stored in 0, naturals are stored in 22)
+        dealerTotalProbs = [[0 for t in range(23)] for dfu in cards]
+        for dfu in cards:
+            dealerTotalProbs[dfu-1][0] = dealer3TotalProbs[dfu-1][0][0]
+            for a1 in range(2):
+                for t1 in range(22):
+                    dealerTotalProbs[dfu-1][0] += dealer3TotalProbs[dfu-1][a1][t1]*dealerCTotalProbs[dfu-1][a1][t1][0]
+            for t in range(17,23):
+                for a in range(2):
+                    if t == 22 or stands(t, a):
+                        dealerTotalProbs[dfu-1][t] += dealer3TotalProbs[dfu-1][a][t]
+                for a1 in range(2):
+                    for t1 in range((5 if a1 == 0 else 13),18):
+                        if not stands(t1, a1):
+                            dealerTotalProbs[dfu-1][t] += dealer3TotalProbs[dfu-1][a1][t1]*dealerCTotalProbs[dfu-1][a1][t1][t]
+        dealerTotalProbsNoNatural = [[0 for t in range(23)] for dfu in cards]
+        for dfu in cards:
+            for t in range(22):
+                dealerTotalProbsNoNatural[dfu-1][t] = dealerTotalProbs[dfu-1][t]/(1-dealerTotalProbs[dfu-1][22])
+        self.dealerTotalProbs = dealerTotalProbs
+        self.dealerTotalProbsNoNatural = dealerTotalProbsNoNatural
+
+        # player's hole card probabilities
+        self.probPlayerNatural = [0 for dfu in cards]
+        self.probPlayerPair = [[0 for c in cards] for dfu in cards]
+        self.probPlayerHoleNoNaturalNoPair = [[[0 for t in range(22)] for a in [0,1]] for dfu in cards]
+        for dfu in cards:
+            self.probPlayerNatural[dfu-1] = drawProb([dfu], [1, 10]) + drawProb([dfu], [10, 1])
+            for c in cards:
+                self.probPlayerPair[dfu-1][c-1] = drawProb([dfu], [c, c])
+            for i in cards:
+                for j in cards:
+                    if i == j: # skip pairs
+                        continue
+                    t,a = handTotal([i,j])
+                    if t == 21: # skip naturals
+                        continue
+                    self.probPlayerHoleNoNaturalNoPair[dfu-1][a][t] += drawProb([dfu], [i,j])
+
+        # standing (Es,x for x <= 21)
+        self.ewS = [[self._ew_s(dfu, t) for t in range(22)] for dfu in cards]
+
+        # drawing one card (Ed,x), built as needed
+        self.ewD = {}
+
+        # player's conditional total tables by M(D),M*(D), built as needed
+        self.playerCTotalProbs = {}
+
+    # conditional probabilities of final totals (busts are stored in 0) given a partial total,
+    # for a hand that draws with replacement from the shoe until stands(t,a) is true
+    #
+    # Returns probs with probs[a][t] = final total probabilities for partial total t,a.
+    def _conditionalTotalProbs(self, stands):
+        if self.useChain:
+            return absorbingTotalProbs(stands, self._drawProb1)
+        probs = [[[0 for t in range(22)] for t1 in range(22)] for a1 in [0,1]]
+        def build(t1, a1, t, a, p):
+            if t > 21:
+                probs[a1][t1][0] += p
+            elif stands(t, a):
+                probs[a1][t1][t] += p
+            else:
+                for c in cards:
+                    tc,ac = addCard(t, a, c)
+                    build(t1, a1, tc, ac, self._drawProb1([], c)*p)
+        for a1 in range(2):
+            for t1 in range((4 if a1 == 0 else 12),22):
+                build(t1, a1, t1, a1, 1.0)
+        return probs
+
+    def _ew_s(self, dfu, t):
+        dtp = self.dealerTotalProbsNoNatural[dfu-1]
+        # player wins on dealer bust
+        ew = dtp[0]
+        # player wins on dealer total less than t
+        for i in range(17,t):
+            ew += dtp[i]
+        # player loses on dealer total greater than t (and not bust)
+        for i in range(t+1,22):
+            ew -= dtp[i]
+        return ew
+
+    # Es,x
+    def ew_s(self, dfu, t):
+        if t > 21:
+            return -1 # player loses on bust
+        return self.ewS[dfu-1][t]
+
+    # Ed,x
+    def ew_d(self, dfu, t, a):
+        key = (dfu, t, a)
+        if key in self.ewD:
+            return self.ewD[key]
+        dtp = self.dealerTotalProbsNoNatural[dfu-1]
+        ew = 0.0
+        for c in cards:
+            pc = self._drawProb1([], c)
+            tc,ac = addCard(t, a, c)
+            if tc < 17:
+                # player wins on dealer bust, loses otherwise (dealer's total is always >= 17)
+                ew += pc*(2*dtp[0] - 1)
+            elif tc > 21:
+                # player loses on bust
+                ew -= pc
+            else:
+                # player wins on dealer bust
+                ew += pc*dtp[0]
+                # player wins on dealer total less than t
+                for i in range(17,tc):
+                    ew += pc*dtp[i]
+                # player loses on dealer total greater than t (and not bust)
+                for i in range(tc+1,22):
+                    ew -= pc*dtp[i]
+        self.ewD[key] = ew
+        return ew
+
+    # EM,M*;x
+    def ew_m(self, strategy, dfu, t, a):
+        m = strategy.M_D(dfu, a)
+        if t >= m:
+            return self.ew_s(dfu, t)
+        if self.paper and t < (5 if a == 0 else 13):
+            # like the paper's tables, the conditional total tables start at hard 5 and soft 13, so
+            # a pair of 2's or aces that isn't split adds nothing (as in baldwinpaper.py)
+            return 0.0
+        standing = strategy.standing[dfu-1]
+        ptp = self.playerCTotalProbs.get(standing)
+        if ptp is None:
+            ptp = self._conditionalTotalProbs(lambda t, a: t >= standing[a])
+            self.playerCTotalProbs[standing] = ptp
+        ew = 0.0
+        for h in range(m if self.paper else min(standing),22):
+            ew += ptp[a][t][h]*self.ew_s(dfu, h) # stand at h >= M
+        ew -= ptp[a][t][0] # bust
+        return ew
+
+    # Esplit,y
+    def ew_split(self, strategy, dfu, y):
+        ew = 0.0
+        for c in cards:
+            pc = self._drawProb1([dfu, y, y], c)
+            tc,ac = handTotal([y, c])
+            if y == 1:
+                ew += pc*self.ew_s(dfu, tc)
+            elif self.rules.das and self.doubles(strategy, dfu, tc, ac):
+                ew += pc*2*self.ew_d(dfu, tc, ac)
+            else:
+                ew += pc*self.ew_m(strategy, dfu, tc, ac)
+        return 2*ew
+
+    # E(WD)
+    def ew_D(self, strategy, dfu):
+        pnat = self.probPlayerNatural[dfu-1]
+        pnn = self.probPlayerHoleNoNaturalNoPair[dfu-1]
+        ewNatural = -(1.0-pnat)
+        ew = self.rules.blackjackPays*pnat
+        for c in cards:
+            if c in strategy.Y_D(dfu):
+                ew += self.probPlayerPair[dfu-1][c-1]*self.ew_split(strategy, dfu, c)
+            else:
+                t,a = handTotal([c,c])
+                if self.doubles(strategy, dfu, t, a):
+                    ew += self.probPlayerPair[dfu-1][c-1]*2*self.ew_d(dfu, t, a)
+                else:
+                    ew += self.probPlayerPair[dfu-1][c-1]*self.ew_m(strategy, dfu, t, a)
+        for j in range(1,22):
+            if self.doubles(strategy, dfu, j, 0):
+                ew += pnn[0][j]*2*self.ew_d(dfu, j, 0)
+            else:
+                ew += pnn[0][j]*self.ew_m(strategy, dfu, j, 0)
+            if self.doubles(strategy, dfu, j, 1):
+                ew += pnn[1][j]*2*self.ew_d(dfu, j, 1)
+            else:
+                ew += pnn[1][j]*self.ew_m(strategy, dfu, j, 1)
+        pdn = self.dealerTotalProbs[dfu-1][22]
+        return pdn*ewNatural + (1.0-pdn)*ew
+
+    def evaluate(self, strategy):
+        byDfu = [self.ew_D(strategy, dfu) for dfu in cards]
+        return Evaluation(strategy, byDfu, self._overall(byDfu))
+
+
+# hand total t,a for a list of cards (total is soft if a > 0)
+def handTotal(hand):
+    t = 0
+    a = 0
+    for c in hand:
+        t,a = addCard(t, a, c)
+    return t,a
+
+# conditional probabilities of final totals (busts are stored in 0) given a partial total for a
+# hand that draws with replacement (card probabilities drawProb1([], c)) until stands(t,a) is true,
+# solved as an absorbing Markov chain
+def absorbingTotalProbs(stands, drawProb1):
+    states = [(t, a) for a in range(2) for t in range(22)]
+    Q = np.zeros((len(states), len(states))) # partial total to partial total
+    R = np.zeros((len(states), 22)) # partial total to final total
+    for i in range(len(states)):
+        t,a = states[i]
+        if a == 1 and t < 12:
+            continue # not a soft total
+        if stands(t, a):
+            R[i][t] = 1.0
+            continue
+        for c in cards:
+            pc = drawProb1([], c)
+            tc,ac = addCard(t, a, c)
+            if tc > 21:
+                R[i][0] += pc
+            elif stands(tc, ac):
+                R[i][tc] += pc
+            else:
+                Q[i][ac*22+tc] += pc
+    # absorption probabilities B = (I - Q)^-1 R
+    B = np.linalg.solve(np.eye(len(states)) - Q, R)
+    return B.reshape(2, 22, 22).tolist()
+
+
+# the more exact calculation with dependent dealer and player draws (see ewcalc2.py), with the
+# value of a split hand taken to be twice one half of the split (and a resplit half twice one
+# half of that)
+#
+# Dealer total probabilities only depend on the composition of the remaining shoe, so they are
+# shared by every strategy. The player's expected winnings are memoized by strategy as well, so
+# evaluating a strategy again reuses them. Each evaluation is kept as the probability of a player
+# natural that gets paid and the expected winnings from everything else, so engines for rules
+# that only pay naturals differently (see forRules) re-weight them instead of playing the hands.
+#
+# cacheSize: maximum number of cached dealer and player values (0 for unlimited)
+# dealerCache: SQLite file to keep dealer total probabilities in between runs (shared with
+# ewcalc2.py --dealer-cache)
+# outcomesSize: maximum number of cached evaluations, by strategy and shoe (0 for unlimited)
+class DependentEngine(Engine):
+    def __init__(self, rules=None, shoe=None, cacheSize=500000, dealerCache=None, outcomesSize=1000):
+        Engine.__init__(self, rules, shoe)
+        maxsize = cacheSize if cacheSize > 0 else None
+        self.maxsize = maxsize
+        self.dealerTotalProbs = functools.lru_cache(maxsize=maxsize)(self._dealerTotalProbs)
+        self.playerEW = functools.lru_cache(maxsize=maxsize)(self._playerEW)
+        self.splitHandsEW = functools.lru_cache(maxsize=maxsize)(self._splitHandsEW)
+        self.outcomesSize = outcomesSize
+        self.outcomes = collections.OrderedDict() # least recently used first
+        self.dealerCachePath = dealerCache
+        self.dealerCache = None
+        if dealerCache:
+            self.dealerCache = DealerCache(dealerCache, "ewcalc2", self.rules.dealer, self.shoe.counts)
+
+    # engine for other rules
+    #
+    # Tables the new rules can't change are shared: the dealer total probabilities if the dealer
+    # rules are the same, and everything if only the payouts differ, in which case evaluating a
+    # strategy this engine has already evaluated is just a re-weighting of its outcomes.
+    def forRules(self, rules):
+        engine = copy.copy(self)
+        engine.rules = rules
+        if rules.play() == self.rules.play():
+            return engine
+        if rules.dealer != self.rules.dealer:
+            engine.dealerTotalProbs = functools.lru_cache(maxsize=self.maxsize)(engine._dealerTotalProbs)
+            if self.dealerCachePath:
+                engine.dealerCache = DealerCache(self.dealerCachePath, "ewcalc2", rules.dealer, self.shoe.counts)
+        engine.playerEW = functools.lru_cache(maxsize=self.maxsize)(engine._playerEW)
+        engine.splitHandsEW = functools.lru_cache(maxsize=self.maxsize)(engine._splitHandsEW)
+        engine.outcomes = collections.OrderedDict()
+        return engine
+
+    # engine for another shoe (e.g. a depleted one)
+    #
+    # The dealer and player tables are keyed by the remaining shoe counts, not the starting shoe,
+    # so the new engine shares them: every composition both shoes can reach is only worked out once.
+    def forShoe(self, shoe):
+        engine = copy.copy(self)
+        engine.shoe = shoe
+        return engine
+
+    # engine for the shoe with one card c removed (e.g. for effects of removal)
+    def removed(self, c):
+        return self.forShoe(Shoe(removeCard(self.shoe.counts, c)))
+
+    # probabilities of dealer final totals (bust, 17, 18, 19, 20, 21) for a dealer partial hand
+    # with total t,a drawing from the remaining shoe counts
+    def _dealerTotalProbs(self, counts, t, a):
+        stands = self.rules.dealerStands
+        probs = [0.0 for i in range(6)]
+        if stands(t, a):
+            # dealer stands on the first two cards
+            probs[t-16] = 1.0
+            return tuple(probs)
+        n = sum(counts)
+        for k in cards:
+            nk = counts[k-1]
+            if nk == 0:
+                continue
+            pk = nk/n
+            tk,ak = addCard(t, a, k)
+            if tk > 21:
+                probs[0] += pk # bust
+            elif stands(tk, ak):
+                probs[tk-16] += pk # total
+            else:
+                ptk = self.dealerTotalProbs(removeCard(counts, k), tk, ak)
+                for i in range(6):
+                    probs[i] += pk*ptk[i]
+        return tuple(probs)
+
+    # dealer total probabilities through the persistent cache if there is one
+    def dealerTotals(self, counts, t, a):
+        if self.dealerCache is None:
+            return self.dealerTotalProbs(counts, t, a)
+        key = counts + (t, a)
+        dtp = self.dealerCache.get(key)
+        if dtp is None:
+            dtp = self.dealerTotalProbs(counts, t, a)
+            self.dealerCache.put(key, dtp)
+        return dtp
+
+    # expected winnings per unit bet for a player standing on total t with the remaining shoe counts
+    # against a dealer partial hand with total dt,da (dt 22 for a natural, with no hole card)
+    def standEW(self, dt, da, counts, t):
+        if t > 21 or dt == 22:
+            return -1.0 # player loses on bust, or to a dealer natural
+        dtp = self.dealerTotals(counts, dt, da)
+        w = dtp[0] # player wins if dealer busts
+        for d in range(17,22):
+            if d < t:
+                # player wins if dealer total is less than t
+                w += dtp[d-16]
+            elif d > t:
+                # player loses if dealer total is greater than t
+                w -= dtp[d-16]
+        return w
+
+    # expected winnings per unit bet for a player partial hand with total t,a (n2 if it has two cards)
+    # following strategy against a dealer partial hand with total dt,da
+    def _playerEW(self, strategy, dfu, dt, da, counts, t, a, n2):
+        if t > 21:
+            return -1.0 # player loses on bust
+        n = sum(counts)
+        # doubling
+        if n2 and self.doubles(strategy, dfu, t, a):
+            ew = 0.0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    ew += nk/n*self.standEW(dt, da, removeCard(counts, k), tk)
+            return 2*ew
+        # hitting
+        if t < strategy.M_D(dfu, a):
+            ew = 0.0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    ew += nk/n*self.playerEW(strategy, dfu, dt, da, removeCard(counts, k), tk, ak, False)
+            return ew
+        return self.standEW(dt, da, counts, t)
+
+    # expected winnings per unit bet for one half sh of a split pair (the other half is out of the
+    # shoe) when the player has split to the given number of hands, against a dealer partial hand
+    # with total dt,da
+    def splitEW(self, strategy, dfu, dt, da, sh, hands):
+        y = sh.cards[0]
+        ew = 0.0
+        for k in cards:
+            if sh.canDraw(k):
+                hk = sh.draw(k)
+                pk = sh.counts[k-1]/sh.left
+                if k == y and hands < self.rules.splitHands and (y != 1 or self.rules.resplitAces):
+                    # resplitting, the half is taken to be worth twice one half of its split
+                    ew += pk*2*self.splitEW(strategy, dfu, dt, da, hk.split(), hands+1)
+                elif y == 1:
+                    # split aces get one card each
+                    ew += pk*self.standEW(dt, da, hk.counts, hk.t)
+                else:
+                    ew += pk*self.playerEW(strategy, dfu, dt, da, hk.counts, hk.t, hk.a, self.rules.das)
+        return ew
+
+    # exact split evaluation
+    #
+    # Every hand of the split is played from the same shoe, one after the other, and the dealer
+    # draws from what is left after all of them, with resplitting up to rules.splitHands hands.
+    #
+    # The chance of any complete deal (every hand's cards and the dealer's) is a product of falling
+    # counts that doesn't depend on the order the cards come out in, and which hands there are only
+    # depends on the second cards. So the deal can be taken in another order: first the second card
+    # of every hand (resplitting on y's), then each hand's draws, then the dealer's. Once the second
+    # cards are out, the cards one hand draws and then the dealer's are distributed as if nobody
+    # else drew in between (whatever the other hands take is skipped over without looking at it),
+    # so each hand is worth what playerEW gives it against the shoe the second cards leave behind.
+    # The state is just that shoe and the second cards dealt, rather than the cards every earlier
+    # hand drew, and the dealer and player tables are shared with splitEW.
+
+    # expected winnings per unit bet for the hands of a split pair of y's against a dealer partial
+    # hand with total dt,da, dealing second cards from the remaining shoe counts to the pending
+    # hands (there are hands in the split so far, and seconds is the sorted second cards dealt)
+    def _splitHandsEW(self, strategy, dfu, y, dt, da, counts, pending, hands, seconds):
+        if pending == 0:
+            # every hand has its second card
+            ew = 0.0
+            for k in seconds:
+                tk,ak = addCard(*addCard(0, 0, y), k)
+                if y == 1:
+                    # split aces get one card each
+                    ew += self.standEW(dt, da, counts, tk)
+                else:
+                    ew += self.playerEW(strategy, dfu, dt, da, counts, tk, ak, self.rules.das)
+            return ew
+        nc = sum(counts)
+        ew = 0.0
+        for k in cards:
+            nk = counts[k-1]
+            if nk == 0:
+                continue
+            if k == y and hands < self.rules.splitHands and (y != 1 or self.rules.resplitAces):
+                # resplit, the y starts another pending hand and this one gets another card
+                ew += nk/nc*self.splitHandsEW(strategy, dfu, y, dt, da, removeCard(counts, k), pending+1, hands+1, seconds)
+            else:
+                ew += nk/nc*self.splitHandsEW(strategy, dfu, y, dt, da, removeCard(counts, k), pending-1, hands, tuple(sorted(seconds + (k,))))
+        return ew
+
+    # expected winnings per unit bet for splitting the player's first two cards h (a pair) exactly
+    # against a dealer partial hand with total dt,da
+    def exactSplitEW(self, strategy, dfu, dt, da, h):
+        return self.splitHandsEW(strategy, dfu, h.cards[0], dt, da, h.counts, 2, 2, ())
+
+    # expected winnings per unit bet for the player's first two cards h (not a natural)
+    # against a dealer partial hand with total dt,da
+    def initialEW(self, strategy, dfu, dt, da, h):
+        # splitting
+        y = h.cards[0]
+        if y == h.cards[1] and y in strategy.Y_D(dfu):
+            # value of a split hand is taken to be twice one half of the split
+            return 2*self.splitEW(strategy, dfu, dt, da, h.split(), 2)
+        return self.playerEW(strategy, dfu, dt, da, h.counts, h.t, h.a, True)
+
+    # expected winnings for dealer face up card dfu
+    def ew_D(self, strategy, dfu):
+        pNatural, ew = self.dfuOutcomes(strategy, dfu)
+        return self.rules.blackjackPays*pNatural + ew
+
+    # outcomes for dealer face up card dfu: the probability of a player natural that gets paid,
+    # and the expected winnings from everything else
+    #
+    # The dealer's second card is dealt first, but the player can't see it, so a decision to
+    # surrender has to be made for each initial player hand over every second card together.
+    def dfuOutcomes(self, strategy, dfu):
+        counts = self.shoe.counts
+        pNatural = 0.0
+        ew = 0.0
+        play = {} # expected winnings for each initial player hand that could be surrendered
+        surrender = {} # and for surrendering it
+        for d2 in cards:
+            h = Hand(counts).remove(dfu)
+            if not h.canDraw(d2):
+                continue
+            dh = Hand(counts, [dfu, d2])
+            dnat = dh.t == 21
+            h = h.drawOther(d2)
+            for p1i in range(len(cards)):
+                p1 = cards[p1i]
+                for p2i in range(p1i+1):
+                    p2 = cards[p2i]
+                    if not (h.canDraw(p1) and h.draw(p1).canDraw(p2)):
+                        continue
+                    ph = h.draw(p1).draw(p2)
+                    # initial player hands [a,b] and [b,a] are equivalent
+                    p = ph.p*(2 if p2 < p1 else 1)
+                    pnat = ph.t == 21
+                    if pnat:
+                        if not dnat:
+                            pNatural += p
+                        continue
+                    if dnat and self.rules.holeCard:
+                        # player loses their bet if they don't also have a natural
+                        w = -p
+                    elif dnat:
+                        # with no hole card the player plays their hand out and loses every bet
+                        w = p*self.initialEW(strategy, dfu, 22, 0, ph)
+                    else:
+                        w = p*self.initialEW(strategy, dfu, dh.t, dh.a, ph)
+                    ew += w
+                    if self.rules.surrender:
+                        # surrendering only gets half the bet back if the dealer doesn't have a natural
+                        play[p1,p2] = play.get((p1,p2), 0.0) + w
+                        surrender[p1,p2] = surrender.get((p1,p2), 0.0) - (p if dnat else p/2)
+        for hand in play:
+            if surrender[hand] > play[hand]:
+                ew += surrender[hand] - play[hand]
+        return pNatural, ew
+
+    def evaluate(self, strategy):
+        key = (strategy, self.shoe.counts)
+        outcomes = self.outcomes.get(key)
+        if outcomes is None:
+            outcomes = [None for dfu in cards]
+            for dfu in self.shoe.dfus():
+                outcomes[dfu-1] = self.dfuOutcomes(strategy, dfu)
+            if self.dealerCache is not None:
+                self.dealerCache.flush()
+            self.outcomes[key] = outcomes
+            if self.outcomesSize > 0 and len(self.outcomes) > self.outcomesSize:
+                self.outcomes.popitem(last=False)
+        else:
+            self.outcomes.move_to_end(key)
+        byDfu = [None if o is None else self.rules.blackjackPays*o[0] + o[1] for o in outcomes]
+        return Evaluation(strategy, byDfu, self._overall(byDfu))
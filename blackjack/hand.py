@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+# card values (1 for an ace, 10 for any ten valued card)
+cards = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+
+
+# hand total t,a after adding card c to a hand with total t,a (total is soft if a > 0)
+def addCard(t, a, c):
+    t += c
+    if c == 1:
+        t += 10
+        a += 1
+    while t > 21 and a > 0:
+        t -= 10
+        a -= 1
+    return t,a
+
+# shoe counts after removing card c
+def removeCard(counts, c):
+    counts = list(counts)
+    counts[c-1] -= 1
+    return tuple(counts)
+
+
+# partial hand and the shoe it is being dealt from
+#
+# Each draw updates the remaining shoe counts, hand total and running probability in constant
+# time, so nothing has to be rescanned as a hand grows.
+#
+# counts: remaining shoe counts by card (index c-1 for card c)
+# left: number of cards remaining in the shoe
+# cards: cards in the hand, in draw order
+# t,a: hand total (total is soft if a > 0)
+# p: probability of drawing the hand (and any other cards drawn along the way)
+class Hand:
+    __slots__ = ("counts", "left", "cards", "t", "a", "p")
+
+    # hand holding known cards (e.g. the dealer's up card) dealt from a shoe with counts
+    def __init__(self, counts, cards=()):
+        self.counts = tuple(counts)
+        self.left = sum(counts)
+        self.cards = ()
+        self.t = 0
+        self.a = 0
+        self.p = 1.0
+        for c in cards:
+            self._add(c)
+            self._remove(c)
+
+    def _copy(self):
+        h = Hand.__new__(Hand)
+        h.counts = self.counts
+        h.left = self.left
+        h.cards = self.cards
+        h.t = self.t
+        h.a = self.a
+        h.p = self.p
+        return h
+
+    def _add(self, c):
+        self.cards += (c,)
+        self.t,self.a = addCard(self.t, self.a, c)
+
+    def _remove(self, c):
+        self.counts = removeCard(self.counts, c)
+        self.left -= 1
+
+    # true if card c is still in the shoe
+    def canDraw(self, c):
+        return self.counts[c-1] > 0
+
+    # hand after drawing card c
+    def draw(self, c):
+        h = self._copy()
+        h.p = self.p*(self.counts[c-1]/self.left)
+        h._add(c)
+        h._remove(c)
+        return h
+
+    # hand after card c is drawn from the shoe to another hand
+    def drawOther(self, c):
+        h = self._copy()
+        h.p = self.p*(self.counts[c-1]/self.left)
+        h._remove(c)
+        return h
+
+    # hand after known card c is removed from the shoe (e.g. the dealer's up card)
+    def remove(self, c):
+        h = self._copy()
+        h._remove(c)
+        return h
+
+    # first half of a split pair (the other half stays out of the shoe)
+    def split(self):
+        h = self._copy()
+        h.cards = ()
+        h.t = 0
+        h.a = 0
+        h._add(self.cards[0])
+        return h
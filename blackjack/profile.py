@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import time
+import json
+import functools
+
+
+# hot path counters and timers for the --profile option of the scripts
+#
+# Calls to a function are counted by decorating it with counted (above functools.lru_cache to
+# count cache hits as well). When profiling is off counted returns the function unchanged, so the
+# scripts don't pay for the counters. Other counts can be added directly with count.
+#
+# Phases are timed one after the other, starting with setup: phase(name) ends the phase before it
+# and starts timing a new one, and phase(name, dfu) also charges the time to a dealer face up card.
+# Work that is timed on its own (e.g. in pool worker processes, where it overlaps) is charged to a
+# face up card with dfuTime, and take/merge carry the counts and face up card times of a worker
+# back to the parent.
+#
+# script: name of the script being profiled
+# enabled: true if profiling (counters are only installed when enabled)
+class Profile:
+    def __init__(self, script, enabled):
+        self.script = script
+        self.enabled = enabled
+        self.counts = {}
+        self.phases = {}
+        self.dfus = {}
+        self.start = time.perf_counter()
+        self.current = ("setup", None, self.start)
+
+    # count n more of name
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    # decorator counting calls to function f (under its own name, or name for a function that is
+    # wrapped after the fact, like an engine's memoized methods)
+    def counted(self, f, name=None):
+        if not self.enabled:
+            return f
+        name = name if name else f.__name__
+        counts = self.counts
+        counts.setdefault(name, 0)
+        @functools.wraps(f)
+        def g(*args):
+            counts[name] += 1
+            return f(*args)
+        if hasattr(f, "cache_info"):
+            g.cache_info = f.cache_info
+            g.cache_clear = f.cache_clear
+        return g
+
+    # start timing phase name (charged to dealer face up card dfu as well if given)
+    def phase(self, name, dfu=None):
+        now = time.perf_counter()
+        if self.current is not None:
+            name0,dfu0,start = self.current
+            self.phases[name0] = self.phases.get(name0, 0.0) + (now - start)
+            if dfu0 is not None:
+                self.dfuTime(name0, dfu0, now - start)
+        self.current = (name, dfu, now) if name is not None else None
+
+    # end the current phase
+    def end(self):
+        self.phase(None)
+
+    # charge seconds of phase name to dealer face up card dfu
+    def dfuTime(self, name, dfu, seconds):
+        times = self.dfus.setdefault(dfu, {})
+        times[name] = times.get(name, 0.0) + seconds
+
+    # counts and face up card times since the last take (e.g. in a pool worker)
+    def take(self):
+        taken = (dict(self.counts), self.dfus)
+        for name in self.counts:
+            self.counts[name] = 0
+        self.dfus = {}
+        return taken
+
+    # add counts and face up card times from take
+    def merge(self, taken):
+        counts,dfus = taken
+        for name,n in counts.items():
+            self.count(name, n)
+        for dfu,times in dfus.items():
+            for name,seconds in times.items():
+                self.dfuTime(name, dfu, seconds)
+
+    # structured report
+    def report(self):
+        return {
+            "script": self.script,
+            "seconds": time.perf_counter() - self.start,
+            "phases": self.phases,
+            "dfus": {str(dfu): self.dfus[dfu] for dfu in sorted(self.dfus)},
+            "counts": self.counts,
+        }
+
+    # write the report to a JSON file and print a summary
+    def save(self, path):
+        self.end()
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+            f.write("\n")
+        print("\nprofile:", self.script, "seconds:", round(report["seconds"], 3), "report:", path)
+        total = report["seconds"]
+        print("phase seconds percent")
+        for name,seconds in report["phases"].items():
+            print(name, round(seconds, 3), round(100*seconds/total, 1))
+        if report["dfus"]:
+            names = []
+            for times in report["dfus"].values():
+                names += [name for name in times if name not in names]
+            print("seconds by dealer face up card (" + ", ".join(names) + ")")
+            for dfu,times in report["dfus"].items():
+                print(dfu, " ".join(str(round(times.get(name, 0.0), 3)) for name in names))
+        print("counts")
+        for name,n in report["counts"].items():
+            if n:
+                print(name, n)
@@ -0,0 +1,144 @@
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+from fractions import Fraction
+
+
+# two card totals the player can double down on (None for any two cards)
+doubleTotals = {"any": None, "9-11": (9, 10, 11), "10-11": (10, 11)}
+
+
+# rules of the game (a natural can only be formed by the first two cards)
+#
+# blackjackPays: amount won per unit bet on a player natural
+# das: true if the player can double down after splitting a pair
+# hitSoft17: true if the dealer hits soft 17 (H17), otherwise the dealer stands on 17 (S17)
+# double: two card hands the player can double down on: "any" two cards, or only hard "9-11" or
+# "10-11"
+# surrender: true if the player can give up half their bet instead of playing their first two
+# cards (late surrender, after the dealer checks for a natural)
+# splitHands: maximum number of hands a player can split to (2 for no resplitting)
+# resplitAces: true if aces can be resplit as well (split aces always get one card each)
+# holeCard: true if the dealer checks for a natural before the player plays, false if the dealer
+# has no hole card and a dealer natural takes every bet the player made (doubles and splits too)
+class Rules:
+    def __init__(self, blackjackPays=1.5, das=True, hitSoft17=False, double="any", surrender=False, splitHands=2, resplitAces=False, holeCard=True):
+        if double not in doubleTotals:
+            raise ValueError("double must be one of "+", ".join(doubleTotals))
+        if splitHands < 2:
+            raise ValueError("split hands must be at least 2")
+        self.blackjackPays = blackjackPays
+        self.das = das
+        self.hitSoft17 = hitSoft17
+        self.double = double
+        self.surrender = surrender
+        self.splitHands = splitHands
+        self.resplitAces = resplitAces
+        self.holeCard = holeCard
+        self.doubleTotals = doubleTotals[double]
+
+    # description of the dealer rules, for keying tables that only depend on them
+    @property
+    def dealer(self):
+        return "hit soft 17" if self.hitSoft17 else "stand on 17"
+
+    # true if the dealer stands on total t,a
+    def dealerStands(self, t, a):
+        return t >= 17 and not (self.hitSoft17 and t == 17 and a > 0)
+
+    # true if the player can double down on a two card total t,a
+    def canDouble(self, t, a):
+        return self.doubleTotals is None or (a == 0 and t in self.doubleTotals)
+
+    # rules that change how hands are played (everything but the payouts), for keying tables of
+    # outcome probabilities that can be re-weighted for other payouts
+    def play(self):
+        return (self.dealer, self.das, self.double, self.surrender, self.splitHands, self.resplitAces, self.holeCard)
+
+    def key(self):
+        return self.play() + (self.blackjackPays,)
+
+    def __eq__(self, other):
+        return isinstance(other, Rules) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return "Rules(blackjackPays=%r, das=%r, hitSoft17=%r, double=%r, surrender=%r, splitHands=%r, resplitAces=%r, holeCard=%r)" % (self.blackjackPays, self.das, self.hitSoft17, self.double, self.surrender, self.splitHands, self.resplitAces, self.holeCard)
+
+    # the usual shorthand for the rules, e.g. "H17 6:5 D10 DAS LS SP4 RSA ENHC"
+    def __str__(self):
+        bj = Fraction(self.blackjackPays).limit_denominator(100)
+        s = ["H17" if self.hitSoft17 else "S17", "%d:%d" % (bj.numerator, bj.denominator)]
+        s.append({"any": "DOA", "9-11": "D9", "10-11": "D10"}[self.double])
+        s.append("DAS" if self.das else "NDAS")
+        if self.surrender:
+            s.append("LS")
+        s.append("SP%d" % self.splitHands)
+        if self.resplitAces:
+            s.append("RSA")
+        if not self.holeCard:
+            s.append("ENHC")
+        return " ".join(s)
+
+    # rules from the shorthand (separated by spaces or commas, in any case), with the rules that
+    # aren't given taken from base:
+    #
+    # S17, H17: dealer stands on or hits soft 17
+    # 3:2, 6:5, ...: blackjack payout
+    # DOA, D9, D10: double on any two cards, 9-11 or 10-11
+    # DAS, NDAS: double after splitting or not
+    # LS, NS: late surrender or no surrender
+    # SP2, SP3, SP4, ...: split to at most 2, 3, 4, ... hands
+    # RSA, NRSA: resplit aces or not
+    # ENHC, PEEK: no hole card (European) or the dealer checks for a natural
+    @staticmethod
+    def parse(s, base=None):
+        base = base if base is not None else Rules()
+        r = dict(blackjackPays=base.blackjackPays, das=base.das, hitSoft17=base.hitSoft17, double=base.double, surrender=base.surrender, splitHands=base.splitHands, resplitAces=base.resplitAces, holeCard=base.holeCard)
+        flags = {
+            "S17": ("hitSoft17", False), "H17": ("hitSoft17", True),
+            "DOA": ("double", "any"), "D9": ("double", "9-11"), "D10": ("double", "10-11"),
+            "DAS": ("das", True), "NDAS": ("das", False),
+            "LS": ("surrender", True), "NS": ("surrender", False),
+            "RSA": ("resplitAces", True), "NRSA": ("resplitAces", False),
+            "ENHC": ("holeCard", False), "PEEK": ("holeCard", True),
+        }
+        for rule in s.upper().replace(",", " ").split():
+            if rule in flags:
+                r[flags[rule][0]] = flags[rule][1]
+            elif ":" in rule:
+                try:
+                    won,bet = rule.split(":")
+                    r["blackjackPays"] = int(won)/int(bet)
+                except ValueError:
+                    raise ValueError("bad blackjack payout "+rule)
+            elif rule.startswith("SP") and rule[2:].isdigit():
+                r["splitHands"] = int(rule[2:])
+            else:
+                raise ValueError("unknown rule "+rule)
+        return Rules(**r)
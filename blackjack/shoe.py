@@ -0,0 +1,68 @@
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+from blackjack.hand import cards
+
+
+# composition of a shoe
+#
+# counts: number of cards of each value (index c-1 for card c)
+# total: number of cards
+class Shoe:
+    def __init__(self, counts):
+        counts = tuple(counts)
+        if len(counts) != len(cards) or min(counts) < 0:
+            raise ValueError("shoe must have 10 non-negative counts (A,2,...,9,10)")
+        self.counts = counts
+        self.total = sum(counts)
+
+    # shoe made up of n full decks
+    @staticmethod
+    def decks(n):
+        if n < 1:
+            raise ValueError("number of decks must be at least 1")
+        return Shoe([4*n for c in range(9)] + [16*n])
+
+    # shoe from comma separated counts of A,2,...,9,10 (as given to the scripts' --shoe option)
+    @staticmethod
+    def parse(s):
+        try:
+            counts = [int(n) for n in s.split(",")]
+        except ValueError:
+            raise ValueError("shoe counts must be integers")
+        return Shoe(counts)
+
+    # dealer face up cards that can be dealt from the shoe
+    def dfus(self):
+        return [dfu for dfu in cards if self.counts[dfu-1] > 0]
+
+    def __eq__(self, other):
+        return isinstance(other, Shoe) and self.counts == other.counts
+
+    def __hash__(self):
+        return hash(self.counts)
+
+    def __repr__(self):
+        return "Shoe(%r)" % (self.counts,)
@@ -0,0 +1,252 @@
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import os
+import json
+import csv
+
+from blackjack.hand import cards
+
+
+# directory holding the built in strategy charts
+builtinDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "strategies")
+
+# dealer face up cards in chart column order, and pairs in chart row order (as in the README)
+chartColumns = [2, 3, 4, 5, 6, 7, 8, 9, 10, 1]
+chartPairs = [1, 10, 9, 8, 7, 6, 5, 4, 3, 2]
+
+# chart sections: (section, a) for each table
+chartStands = [("Hard Stand", 0), ("Soft Stand", 1)]
+chartDoubles = [("Hard Double", 0), ("Soft Double", 1)]
+chartSplits = "Pair"
+
+# compiled table indexes: hand total t,a (t < 32) or pair card c against dealer face up card dfu
+def _ti(dfu, t, a):
+    return (dfu*2+a)*32+t
+
+def _ci(dfu, c):
+    return dfu*11+c
+
+def _cardName(c):
+    return "A" if c == 1 else str(c)
+
+def _parseCard(s):
+    return 1 if s == "A" else int(s)
+
+
+# strategy in the form used by Baldwin et al.
+#
+# M_D(dfu, a): minimum standing number for hard (a = 0) and soft (a = 1) totals
+# X_D(dfu, a): hard or soft totals to double down on
+# Y_D(dfu): pairs to split
+#
+# The functions are evaluated once for every dealer face up card, so a strategy can be compared,
+# hashed and used as a cache key. They are also compiled into flat lookup tables, so a decision
+# during hand expansion (hit, double, split) is a single index instead of a call that rebuilds a
+# list of totals.
+class Strategy:
+    # names of the strategies built into the scripts
+    builtins = ["baldwin-optimum", "culbertson", "mimicdealer"]
+
+    def __init__(self, name, M_D, X_D, Y_D):
+        self.name = name
+        self.standing = tuple((M_D(dfu, 0), M_D(dfu, 1)) for dfu in cards)
+        self.doubles = tuple((frozenset(X_D(dfu, 0)), frozenset(X_D(dfu, 1))) for dfu in cards)
+        self.splits = tuple(frozenset(Y_D(dfu)) for dfu in cards)
+        self._key = (self.standing, tuple((tuple(sorted(x[0])), tuple(sorted(x[1]))) for x in self.doubles), tuple(tuple(sorted(y)) for y in self.splits))
+        self._hash = hash(self._key)
+        self.hitTable = [False]*_ti(11, 0, 0)
+        self.doubleTable = [False]*_ti(11, 0, 0)
+        self.splitTable = [False]*_ci(11, 0)
+        for dfu in cards:
+            for a in (0, 1):
+                for t in range(32):
+                    self.hitTable[_ti(dfu, t, a)] = t < self.standing[dfu-1][a]
+                    self.doubleTable[_ti(dfu, t, a)] = t in self.doubles[dfu-1][a]
+            for c in cards:
+                self.splitTable[_ci(dfu, c)] = c in self.splits[dfu-1]
+
+    # compiled decisions: hit (rather than stand on) hand total t,a, double down on t,a, split pair c
+    def hit(self, dfu, t, a):
+        return self.hitTable[(dfu*2+a)*32+t]
+
+    def double(self, dfu, t, a):
+        return self.doubleTable[(dfu*2+a)*32+t]
+
+    def split(self, dfu, c):
+        return self.splitTable[dfu*11+c]
+
+    def M_D(self, dfu, a):
+        return self.standing[dfu-1][1 if a else 0]
+
+    def X_D(self, dfu, a):
+        return self.doubles[dfu-1][1 if a else 0]
+
+    def Y_D(self, dfu):
+        return self.splits[dfu-1]
+
+    def key(self):
+        return self._key
+
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Strategy) and self._key == other._key)
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return "Strategy(%r)" % (self.name,)
+
+    # strategy file contents (JSON)
+    #
+    # standing: [M(D), M*(D)] for each dealer face up card A,2,...,10
+    # doubles: [hard totals, soft totals] to double down on for each dealer face up card
+    # splits: pairs to split for each dealer face up card
+    def toJSON(self):
+        return {
+            "name": self.name,
+            "standing": [list(m) for m in self.standing],
+            "doubles": [[sorted(x[0]), sorted(x[1])] for x in self.doubles],
+            "splits": [sorted(y) for y in self.splits],
+        }
+
+    # strategy chart contents (CSV), laid out like the tables in the README
+    #
+    # Each section starts with a header row (section name then the dealer face up cards 2,...,10,A)
+    # followed by one row per pair or total:
+    #
+    # Pair: pairs to split are marked with S
+    # Hard Double, Soft Double: totals to double down on are marked with D
+    # Hard Stand, Soft Stand: the minimum standing number is marked with S (stand on it or greater)
+    def toChart(self):
+        rows = [[chartSplits] + [_cardName(dfu) for dfu in chartColumns]]
+        for c in chartPairs:
+            rows.append([_cardName(c)] + ["S" if c in self.Y_D(dfu) else "" for dfu in chartColumns])
+        for section,a in chartDoubles:
+            rows.append([])
+            rows.append([section] + [_cardName(dfu) for dfu in chartColumns])
+            totals = set().union(*[self.X_D(dfu, a) for dfu in cards])
+            if totals:
+                for t in range(max(totals), min(totals)-1, -1):
+                    rows.append([str(t)] + ["D" if t in self.X_D(dfu, a) else "" for dfu in chartColumns])
+        for section,a in chartStands:
+            rows.append([])
+            rows.append([section] + [_cardName(dfu) for dfu in chartColumns])
+            totals = [self.M_D(dfu, a) for dfu in cards]
+            for t in range(max(totals), min(totals)-1, -1):
+                rows.append([str(t)] + ["S" if t == self.M_D(dfu, a) else "" for dfu in chartColumns])
+        return rows
+
+    def save(self, path):
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as f:
+                csv.writer(f, lineterminator="\n").writerows(self.toChart())
+            return
+        # one line per table, so a strategy file can be read (and diffed) like the tables in the README
+        d = self.toJSON()
+        with open(path, "w") as f:
+            f.write("{\n" + ",\n".join(" " + json.dumps(k) + ": " + json.dumps(v) for k,v in d.items()) + "\n}\n")
+
+    # strategy from the contents of a strategy file
+    @staticmethod
+    def fromJSON(d, name=None):
+        try:
+            standing = d["standing"]
+            doubles = d["doubles"]
+            splits = d["splits"]
+            if len(standing) != len(cards) or len(doubles) != len(cards) or len(splits) != len(cards):
+                raise ValueError("strategy tables must have an entry for each dealer face up card")
+            def M_D(dfu, a):
+                return int(standing[dfu-1][a])
+            def X_D(dfu, a):
+                return [int(t) for t in doubles[dfu-1][a]]
+            def Y_D(dfu):
+                return [int(c) for c in splits[dfu-1]]
+            return Strategy(d.get("name", name), M_D, X_D, Y_D)
+        except (KeyError, IndexError, TypeError) as e:
+            raise ValueError("bad strategy: "+repr(e))
+
+    # strategy from the rows of a strategy chart
+    @staticmethod
+    def fromChart(rows, name=None):
+        sections = {}
+        section = None
+        for row in rows:
+            row = [s.strip() for s in row]
+            if not any(row) or row[0].startswith("#"):
+                continue
+            if not row[0][0].isdigit() and row[0] != "A":
+                section = row[0]
+                if section in sections:
+                    raise ValueError("bad strategy: duplicate section "+section)
+                try:
+                    columns = [_parseCard(s) for s in row[1:]]
+                except ValueError:
+                    raise ValueError("bad strategy: bad header for section "+section)
+                if sorted(columns) != cards:
+                    raise ValueError("strategy tables must have an entry for each dealer face up card")
+                sections[section] = [columns, {}]
+                continue
+            if section is None:
+                raise ValueError("bad strategy: row before first section")
+            columns,marks = sections[section]
+            try:
+                r = _parseCard(row[0])
+            except ValueError:
+                raise ValueError("bad strategy: bad row "+row[0]+" in section "+section)
+            marks[r] = [dfu for dfu,s in zip(columns, row[1:]) if s]
+        for section in [chartSplits] + [s for s,a in chartDoubles + chartStands]:
+            if section not in sections:
+                sections[section] = [cards, {}]
+        standing = {}
+        for section,a in chartStands:
+            for dfu in cards:
+                m = [t for t,marked in sections[section][1].items() if dfu in marked]
+                if len(m) != 1:
+                    raise ValueError("bad strategy: "+section+" needs one standing number for dealer face up card "+_cardName(dfu))
+                standing[dfu, a] = m[0]
+        def M_D(dfu, a):
+            return standing[dfu, a]
+        def X_D(dfu, a):
+            return [t for t,marked in sections[chartDoubles[a][0]][1].items() if dfu in marked]
+        def Y_D(dfu):
+            return [c for c,marked in sections[chartSplits][1].items() if dfu in marked]
+        return Strategy(name, M_D, X_D, Y_D)
+
+    # strategy from a strategy file, JSON or a CSV chart (named after the file if it doesn't have a name)
+    @staticmethod
+    def load(path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, newline="") as f:
+            if path.endswith(".csv"):
+                return Strategy.fromChart(csv.reader(f), name)
+            return Strategy.fromJSON(json.load(f), name)
+
+    # one of the built in strategies (shipped as strategy charts in the strategies directory)
+    @staticmethod
+    def builtin(strategy):
+        if strategy not in Strategy.builtins:
+            raise ValueError("unknown strategy "+strategy)
+        return Strategy.load(os.path.join(builtinDir, strategy+".csv"))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import multiprocessing
+import time
+
+from blackjack import cards, Rules, Shoe, Strategy, DependentEngine
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [strategy]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=0, help="maximum number of cached dealer total distributions and player expected winnings (default 0 for unlimited)")
+    optparser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1, help="number of worker processes (default 1)")
+    optparser.add_option("--no-das", action="store_false", dest="das", default=True, help="don't allow doubling down after splitting a pair")
+    optparser.add_option("--blackjack-pays", action="store", type="float", dest="blackjackPays", default=1.5, help="amount won per unit bet on a player natural (default 1.5)")
+    optparser.add_option("-r", "--rules", action="store", type="string", dest="rules", default="", help="other rules in the usual shorthand, e.g. \"H17 LS SP4\" (see blackjack/rules.py)")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("cacheSize:",opts.cacheSize)
+        print("jobs:",opts.jobs)
+        print("das:",opts.das)
+        print("blackjackPays:",opts.blackjackPays)
+        print("rules:",opts.rules)
+        print("args:",args)
+
+    strategy = "baldwin-optimum"
+    if len(args) > 0:
+        strategy = args.pop()
+    print("Using strategy:",strategy)
+    try:
+        if strategy.endswith(".json") or strategy.endswith(".csv"):
+            strategy = Strategy.load(strategy)
+        else:
+            strategy = Strategy.builtin(strategy)
+        shoe = Shoe.parse(opts.shoe) if opts.shoe else Shoe.decks(opts.decks)
+        rules = Rules.parse(opts.rules, Rules(blackjackPays=opts.blackjackPays, das=opts.das))
+    except ValueError as e:
+        optparser.error(str(e))
+    if opts.verbose:
+        print("Using rules:",rules)
+
+    # effects of removal
+    #
+    # The expected winnings are evaluated for the full shoe first and then for the shoe with one
+    # card of each rank removed. Engines for the removal shoes share the full shoe's tables, which
+    # are keyed by the remaining shoe counts: once the removed card would have been dealt anyway
+    # the compositions are the same as the full shoe's, so only the ones without it are new work.
+    # With more than one job the ranks are handed out to forked workers, each starting from a
+    # copy of the full shoe's tables.
+    engine = DependentEngine(rules, shoe, opts.cacheSize)
+    start = time.perf_counter()
+    full = engine.evaluate(strategy)
+    if opts.verbose:
+        print("full shoe seconds:", round(time.perf_counter() - start, 3))
+
+    # expected winnings by dealer face up card and overall for the shoe with a card of rank c removed
+    def evalRemoval(c):
+        start = time.perf_counter()
+        removal = engine.removed(c).evaluate(strategy)
+        return removal.byDfu, removal.overall, time.perf_counter() - start
+
+    ranks = [c for c in cards if shoe.counts[c-1] > 0]
+    results = {}
+    if opts.jobs > 1:
+        global _evalRemoval
+        _evalRemoval = evalRemoval
+        with multiprocessing.get_context("fork").Pool(opts.jobs) as pool:
+            for c, r in pool.imap_unordered(evalRemovalWorker, ranks, chunksize=1):
+                results[c] = r
+    else:
+        for c in ranks:
+            results[c] = evalRemoval(c)
+    if opts.verbose:
+        print("removal seconds")
+        for c in ranks:
+            print(c, round(results[c][2], 3))
+        if opts.jobs <= 1:
+            print("dealer total cache", engine.dealerTotalProbs.cache_info())
+            print("player cache", engine.playerEW.cache_info())
+
+    # change in expected winnings by dealer face up card (rows) for removing a card of each rank (columns)
+    print("expected winnings by dealer face up card")
+    for dfu in shoe.dfus():
+        print(dfu, full.byDfu[dfu-1])
+    print("overall expected winnings")
+    print(full.overall)
+    print("effects of removal by dealer face up card and removed card")
+    print(" ".join(["dfu".rjust(7)] + [str(c).rjust(10) for c in ranks]))
+    for dfu in cards:
+        if full.byDfu[dfu-1] is None:
+            continue
+        row = [str(dfu).rjust(7)]
+        for c in ranks:
+            ew = results[c][0][dfu-1]
+            row.append("%10.6f" % (ew - full.byDfu[dfu-1]) if ew is not None else "".rjust(10))
+        print(" ".join(row))
+    print(" ".join(["overall"] + ["%10.6f" % (results[c][1] - full.overall) for c in ranks]))
+
+
+# removal evaluator for process pool workers (set before the pool is forked, since closures can't be pickled)
+_evalRemoval = None
+
+def evalRemovalWorker(c):
+    return c, _evalRemoval(c)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import asyncio
+import random
+import math
+import json
+import time
+
+from blackjack import cards, removeCard, Shoe
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [query ...]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output (print every response)")
+    optparser.add_option("-u", "--socket", action="store", type="string", dest="socket", default="evserver.sock", help="Unix socket the server listens on (default evserver.sock)")
+    optparser.add_option("-p", "--port", action="store", type="int", dest="port", default=0, help="connect to this TCP port on localhost instead of a Unix socket")
+    optparser.add_option("-j", "--clients", action="store", type="int", dest="clients", default=4, help="number of concurrent clients (default 4)")
+    optparser.add_option("-q", "--queries", action="store", type="int", dest="queries", default=100, help="number of decision queries each client sends (default 100)")
+    optparser.add_option("--shoes", action="store", type="int", dest="shoes", default=5, help="number of shoe compositions the queries are spread over (default 5)")
+    optparser.add_option("--dealt", action="store", type="int", dest="dealt", default=10, help="number of cards dealt at random from each shoe (default 10)")
+    optparser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=None, help="random seed")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe the compositions are dealt from (default 1)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("socket:",opts.socket)
+        print("port:",opts.port)
+        print("clients:",opts.clients)
+        print("queries:",opts.queries)
+        print("shoes:",opts.shoes)
+        print("dealt:",opts.dealt)
+        print("seed:",opts.seed)
+        print("decks:",opts.decks)
+        print("args:",args)
+
+    if opts.clients < 1 or opts.queries < 1 or opts.shoes < 1:
+        optparser.error("--clients, --queries and --shoes must be at least 1")
+    try:
+        shoe = Shoe.decks(opts.decks)
+    except ValueError as e:
+        optparser.error(str(e))
+    if opts.dealt < 0 or opts.dealt > shoe.total - 8:
+        optparser.error("--dealt must leave at least 8 cards in the shoe")
+
+    async def connect():
+        if opts.port:
+            return await asyncio.open_connection("127.0.0.1", opts.port)
+        return await asyncio.open_unix_connection(opts.socket)
+
+    # send query and wait for the response
+    async def ask(reader, writer, query):
+        writer.write((json.dumps(query)+"\n").encode())
+        await writer.drain()
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        return json.loads(line)
+
+    # queries given as arguments are sent one at a time and their responses printed
+    async def askArgs():
+        reader,writer = await connect()
+        for arg in args:
+            print(json.dumps(await ask(reader, writer, json.loads(arg))))
+        writer.close()
+
+    # shoe compositions with cards dealt at random, like the shoes the queries would come from in play
+    rng = random.Random(opts.seed)
+    def dealtShoe():
+        counts = shoe.counts
+        for i in range(opts.dealt):
+            counts = removeCard(counts, rng.choices(cards, counts)[0])
+        return counts
+    shoes = [dealtShoe() for i in range(opts.shoes)]
+
+    # random decision query: a dealer face up card and the player's first two cards dealt from one
+    # of the shoes, sometimes with a third card if it doesn't bust the hand
+    def randomQuery():
+        counts = shoes[rng.randrange(len(shoes))]
+        while True:
+            dealt = []
+            left = counts
+            for i in range(3):
+                c = rng.choices(cards, left)[0]
+                dealt.append(c)
+                left = removeCard(left, c)
+            dfu,hand = dealt[0],dealt[1:]
+            if sorted(hand) == [1, 10]:
+                continue
+            if rng.random() < 0.25:
+                c = rng.choices(cards, left)[0]
+                if sum(hand) + c <= 21:
+                    hand.append(c)
+            return {"query": "decision", "shoe": list(counts), "dfu": dfu, "cards": hand}
+
+    # one client, sending its queries one after another and timing each round trip
+    async def client(queries, latencies, errors):
+        reader,writer = await connect()
+        for query in queries:
+            start = time.perf_counter()
+            response = await ask(reader, writer, query)
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                errors.append((query, response["error"]))
+            if opts.verbose:
+                print(json.dumps(query), json.dumps(response))
+        writer.close()
+
+    def percentile(xs, q):
+        xs = sorted(xs)
+        return xs[max(0, math.ceil(q*len(xs))-1)]
+
+    async def run():
+        if args:
+            await askArgs()
+            return
+        queries = [[randomQuery() for i in range(opts.queries)] for j in range(opts.clients)]
+        latencies = []
+        errors = []
+        start = time.perf_counter()
+        await asyncio.gather(*(client(qs, latencies, errors) for qs in queries))
+        seconds = time.perf_counter() - start
+        print("queries:", len(latencies), "clients:", opts.clients, "seconds:", round(seconds, 3), "queries/sec:", round(len(latencies)/seconds, 1))
+        print("round trip latency (ms): p50", round(1000*percentile(latencies, 0.5), 3), "p99", round(1000*percentile(latencies, 0.99), 3), "max", round(1000*max(latencies), 3))
+        for query,error in errors:
+            print("error:", json.dumps(query), error)
+        reader,writer = await connect()
+        print("server stats:", json.dumps(await ask(reader, writer, {"query": "stats"})))
+        writer.close()
+
+    try:
+        asyncio.run(run())
+    except (ConnectionError, FileNotFoundError) as e:
+        print("can't reach the server:", e)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import os
+import stat
+import signal
+import asyncio
+import concurrent.futures
+import collections
+import functools
+import math
+import json
+import time
+
+from blackjack import cards, addCard, removeCard, Hand, Rules, Shoe, Strategy, DependentEngine
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output (print every query)")
+    optparser.add_option("-u", "--socket", action="store", type="string", dest="socket", default="evserver.sock", help="Unix socket to listen on (default evserver.sock)")
+    optparser.add_option("-p", "--port", action="store", type="int", dest="port", default=0, help="listen on this TCP port on localhost instead of a Unix socket")
+    optparser.add_option("-s", "--strategy", action="store", type="string", dest="strategy", default="baldwin-optimum", help="strategy name or file for queries that don't give one (default baldwin-optimum)")
+    optparser.add_option("-r", "--rules", action="store", type="string", dest="rules", default="", help="rules for queries that don't give them, in the usual shorthand, e.g. \"H17 LS SP4\" (see blackjack/rules.py)")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe for queries that don't give one (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 for queries that don't give one (overrides --decks)")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=2000000, help="maximum number of cached dealer total distributions and player expected winnings per engine (default 2000000, 0 for unlimited)")
+    optparser.add_option("--results", action="store", type="int", dest="results", default=10000, help="maximum number of cached query results (default 10000)")
+    optparser.add_option("--window", action="store", type="int", dest="window", default=10000, help="number of recent queries the latency percentiles are taken over (default 10000)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("socket:",opts.socket)
+        print("port:",opts.port)
+        print("strategy:",opts.strategy)
+        print("rules:",opts.rules)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("cacheSize:",opts.cacheSize)
+        print("results:",opts.results)
+        print("window:",opts.window)
+
+    if opts.results < 1 or opts.window < 1:
+        optparser.error("--results and --window must be at least 1")
+    try:
+        baseRules = Rules.parse(opts.rules)
+        baseShoe = Shoe.parse(opts.shoe) if opts.shoe else Shoe.decks(opts.decks)
+    except ValueError as e:
+        optparser.error(str(e))
+
+    # strategies by name or file
+    @functools.lru_cache(maxsize=None)
+    def loadStrategy(name):
+        if name.endswith(".json") or name.endswith(".csv"):
+            return Strategy.load(name)
+        return Strategy.builtin(name)
+
+    # engine for rules and shoe
+    #
+    # As in rulesets.py there is one engine for each way of playing the hands (Rules.play), made
+    # from an engine with the same dealer rules where there is one. The tables are keyed by the
+    # remaining shoe counts, so engines for other shoes share them (DependentEngine.forShoe), and
+    # they stay warm for as long as the server runs. Every cache is bounded, since clients can ask
+    # about any number of shoes: the engines keep as many evaluations as the result cache.
+    engines = {}
+    def engineFor(rules, shoe):
+        engine = engines.get(rules.play())
+        if engine is None:
+            dealerEngines = [e for e in engines.values() if e.rules.dealer == rules.dealer]
+            if dealerEngines:
+                engine = dealerEngines[0].forRules(rules)
+            else:
+                engine = DependentEngine(rules, baseShoe, opts.cacheSize, outcomesSize=opts.results)
+            engines[rules.play()] = engine
+        return engine.forRules(rules).forShoe(shoe)
+
+    # query from its JSON object, as a tuple that keys the result cache:
+    #
+    # {"query": "ev", "strategy": ..., "rules": ..., "shoe": ...}
+    #   expected winnings of a strategy, overall and by dealer face up card
+    # {"query": "decision", "dfu": 10, "cards": [10, 6], "strategy": ..., "rules": ..., "shoe": ...}
+    #   expected winnings of each play of a player hand against dealer face up card dfu
+    # {"query": "stats"}
+    #   query counts, result cache hits and latency percentiles
+    #
+    # strategy: strategy name or file (default -s)
+    # rules: rules in the usual shorthand, on top of the -r rules
+    # shoe: counts of A,2,...,9,10 as a list or comma separated string, before any cards in the
+    # query are dealt (default --shoe or -n), or decks: number of decks
+    def parseQuery(query):
+        if not isinstance(query, dict):
+            raise ValueError("query must be a JSON object")
+        kind = query.get("query", "ev")
+        if kind == "stats":
+            return (kind,)
+        strategy = query.get("strategy", opts.strategy)
+        if not isinstance(strategy, str) or not isinstance(query.get("rules", ""), str):
+            raise ValueError("strategy and rules must be strings")
+        rules = Rules.parse(query.get("rules", ""), baseRules)
+        shoe = baseShoe
+        if "shoe" in query:
+            shoe = Shoe.parse(query["shoe"]) if isinstance(query["shoe"], str) else Shoe(int(n) for n in query["shoe"])
+        elif "decks" in query:
+            shoe = Shoe.decks(int(query["decks"]))
+        if kind == "ev":
+            return (kind, strategy, rules, shoe)
+        if kind == "decision":
+            dfu = int(query.get("dfu", 0))
+            hand = tuple(sorted(int(c) for c in query.get("cards", ())))
+            if dfu not in cards or len(hand) < 2 or min(hand) < 1 or max(hand) > 10:
+                raise ValueError("decision needs a dealer face up card dfu and at least two player cards (1 for an ace)")
+            return (kind, strategy, rules, shoe, dfu, hand)
+        raise ValueError("unknown query "+str(kind))
+
+    # expected winnings of a strategy
+    def evQuery(strategy, rules, shoe):
+        evaluation = engineFor(rules, shoe).evaluate(strategy)
+        return {"overall": evaluation.overall, "byDfu": evaluation.byDfu}
+
+    # expected winnings per unit bet of each play the player can make with hand against dealer face
+    # up card dfu, playing on by strategy after hitting or splitting, given that the dealer doesn't
+    # have a natural (if the dealer checks for one)
+    #
+    # The dealer's hole card is averaged over the cards left after the player's hand is dealt.
+    def decisionQuery(strategy, rules, shoe, dfu, hand):
+        engine = engineFor(rules, shoe)
+        h = Hand(shoe.counts)
+        if not h.canDraw(dfu):
+            raise ValueError("dealer face up card can't be dealt from the shoe")
+        h = h.remove(dfu)
+        for c in hand:
+            if not h.canDraw(c):
+                raise ValueError("hand can't be dealt from the shoe")
+            h = h.draw(c)
+        t,a = h.t,h.a
+        n2 = len(hand) == 2
+        if t > 21:
+            raise ValueError("hand is bust")
+        if n2 and t == 21:
+            raise ValueError("hand is a natural")
+        plays = ["stand", "hit"]
+        if n2 and rules.canDouble(t, a):
+            plays.append("double")
+        if n2 and hand[0] == hand[1]:
+            plays.append("split")
+        if n2 and rules.surrender:
+            plays.append("surrender")
+        ew = {play: 0.0 for play in plays}
+        ptotal = 0.0
+        for d2 in cards:
+            if not h.canDraw(d2):
+                continue
+            p = h.counts[d2-1]/h.left
+            dt,da = addCard(*addCard(0, 0, dfu), d2)
+            dnat = dt == 21
+            if dnat and rules.holeCard:
+                # the player only gets to play if the dealer doesn't have a natural
+                continue
+            if dnat:
+                dt,da = 22,0
+            counts = removeCard(h.counts, d2)
+            n = h.left - 1
+            ptotal += p
+            ew["stand"] += p*engine.standEW(dt, da, counts, t)
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    ew["hit"] += p*nk/n*engine.playerEW(strategy, dfu, dt, da, removeCard(counts, k), tk, ak, False)
+                    if "double" in ew:
+                        ew["double"] += p*nk/n*2*engine.standEW(dt, da, removeCard(counts, k), tk)
+            if "split" in ew:
+                ew["split"] += p*2*engine.splitEW(strategy, dfu, dt, da, h.drawOther(d2).split(), 2)
+            if "surrender" in ew:
+                ew["surrender"] -= p*(1.0 if dnat else 0.5)
+        if ptotal == 0:
+            raise ValueError("no dealer hole card can be dealt from the shoe")
+        for play in ew:
+            ew[play] /= ptotal
+        # the play the strategy makes
+        if n2 and hand[0] == hand[1] and hand[0] in strategy.Y_D(dfu):
+            play = "split"
+        elif n2 and engine.doubles(strategy, dfu, t, a):
+            play = "double"
+        elif t < strategy.M_D(dfu, a):
+            play = "hit"
+        else:
+            play = "stand"
+        return {"ew": ew, "best": max(plays, key=lambda play: ew[play]), "strategy": play}
+
+    # result for a parsed query (run in the engine thread)
+    def answer(key):
+        start = time.perf_counter()
+        kind = key[0]
+        strategy = loadStrategy(key[1])
+        if kind == "ev":
+            result = evQuery(strategy, *key[2:])
+        else:
+            result = decisionQuery(strategy, *key[2:])
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    # The engines aren't thread safe, so every calculation runs on one engine thread and the event
+    # loop only parses queries, answers them from the result cache and writes the responses. A
+    # client waiting on a long calculation doesn't hold up cached answers to the others, and
+    # clients asking the same question at the same time share one calculation.
+    engineThread = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    results = collections.OrderedDict() # least recently used first
+    pending = {}
+    stats = {"queries": 0, "errors": 0, "hits": 0, "misses": 0}
+    latencies = collections.deque(maxlen=opts.window)
+
+    def percentile(xs, q):
+        if not xs:
+            return None
+        xs = sorted(xs)
+        return xs[max(0, math.ceil(q*len(xs))-1)]
+
+    def statsQuery():
+        window = list(latencies)
+        return dict(stats, cached=len(results), window=len(window), p50ms=1000*(percentile(window, 0.5) or 0.0), p99ms=1000*(percentile(window, 0.99) or 0.0))
+
+    async def respond(query):
+        key = parseQuery(query)
+        if key[0] == "stats":
+            return statsQuery()
+        result = results.get(key)
+        if result is not None:
+            stats["hits"] += 1
+            results.move_to_end(key)
+            return dict(result, cached=True)
+        stats["misses"] += 1
+        future = pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(engineThread, answer, key)
+            pending[key] = future
+            try:
+                result = await future
+            finally:
+                del pending[key]
+            results[key] = result
+            if len(results) > opts.results:
+                results.popitem(last=False)
+        else:
+            result = await asyncio.shield(future)
+        return dict(result, cached=False)
+
+    # one client connection: a JSON query per line, answered in order with a JSON object per line
+    # (with an "error" if the query can't be answered)
+    async def serveClient(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                start = time.perf_counter()
+                try:
+                    response = await respond(json.loads(line))
+                except (ValueError, TypeError, OSError) as e:
+                    stats["errors"] += 1
+                    response = {"error": str(e)}
+                except Exception as e:
+                    # anything else a query runs into (a KeyError from a malformed field, a
+                    # RecursionError from a calculation) is still answered rather than dropping
+                    # the connection
+                    stats["errors"] += 1
+                    response = {"error": type(e).__name__+": "+str(e)}
+                stats["queries"] += 1
+                latency = time.perf_counter() - start
+                latencies.append(latency)
+                if opts.verbose:
+                    print(round(1000*latency, 3), "ms", line.decode().strip(), "error" if "error" in response else "cached" if response.get("cached") else "")
+                writer.write((json.dumps(response)+"\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve():
+        if opts.port:
+            server = await asyncio.start_server(serveClient, "127.0.0.1", opts.port)
+            print("listening on 127.0.0.1 port", opts.port)
+        else:
+            if os.path.exists(opts.socket) and stat.S_ISSOCK(os.stat(opts.socket).st_mode):
+                # left behind by a server that didn't shut down cleanly
+                os.unlink(opts.socket)
+            server = await asyncio.start_unix_server(serveClient, opts.socket)
+            print("listening on", opts.socket)
+        sys.stdout.flush()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        async with server:
+            await stop.wait()
+        if not opts.port:
+            os.unlink(opts.socket)
+
+    asyncio.run(serve())
+    engineThread.shutdown()
+    print("queries:", stats["queries"], "errors:", stats["errors"], "result cache hits:", stats["hits"], "misses:", stats["misses"])
+    s = statsQuery()
+    print("latency over the last", s["window"], "queries (ms): p50", round(s["p50ms"], 3), "p99", round(s["p99ms"], 3))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
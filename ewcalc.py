@@ -28,177 +28,386 @@
 import sys
 from optparse import OptionParser
 
+import os
 import math
+import functools
+import time
+import resource
+
+from blackjack.hand import addCard, removeCard, Hand
+from blackjack.dealercache import DealerCache
+from blackjack.strategy import Strategy
+from blackjack.profile import Profile
 
 
 def main(argv):
-    optparser = OptionParser("usage: %prog [options] strategy")
+    optparser = OptionParser("usage: %prog [options] [strategy ...]")
     optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-d", "--dfu", action="store", type="int", dest="dfu", default=0, help="dealer face up card to analyze (default all)")
+    optparser.add_option("--strategy-dir", action="store", type="string", dest="strategyDir", default="", help="evaluate every strategy file (*.json, *.csv) in a directory, along with any strategies given")
+    optparser.add_option("--multiset", action="store_true", dest="multiset", default=False, help="enumerate hands as multisets of drawn cards, weighted by the number of orders they can be drawn in")
+    optparser.add_option("--dealer-dag", action="store_true", dest="dealerDAG", default=False, help="work out the dealer totals over a graph of partial hands shared by every order of the same cards, instead of a list of hands")
+    optparser.add_option("--infinite-deck", action="store_true", dest="infiniteDeck", default=False, help="draw every card with the shoe's starting probabilities (the infinite deck limit), working out totals by recursion instead of enumerating hands")
+    optparser.add_option("--dealer-cache", action="store", type="string", dest="dealerCache", default="", help="SQLite file to keep dealer total probabilities in between runs (default none)")
+    optparser.add_option("--profile", action="store", type="string", dest="profile", default="", help="write a JSON profile report (call counts, seconds by phase and dealer face up card) to a file and print a summary")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
     (opts, args) = optparser.parse_args()
 
     if opts.verbose:
         print("verbose:",opts.verbose)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("dfu:",opts.dfu)
+        print("strategyDir:",opts.strategyDir)
+        print("multiset:",opts.multiset)
+        print("dealerDAG:",opts.dealerDAG)
+        print("infiniteDeck:",opts.infiniteDeck)
+        print("dealerCache:",opts.dealerCache)
+        print("profile:",opts.profile)
         print("args:",args)
         
-    strategy = "baldwin-optimum"
-    if len(args) > 0:
-        strategy = args.pop()
-    print("Using strategy:",strategy)
+    # strategies to evaluate (more than one is a batch, sharing the dealer side)
+    strategies = list(args)
+    if opts.strategyDir:
+        strategies += [os.path.join(opts.strategyDir, f) for f in sorted(os.listdir(opts.strategyDir)) if f.endswith(".json") or f.endswith(".csv")]
+    if not strategies:
+        strategies = ["baldwin-optimum"]
+    batch = len(strategies) > 1
+    for strategy in strategies:
+        print("Using strategy:",strategy)
 
-    if strategy == "baldwin-optimum":
-        def M_D(dfu, a):
-            if a == 0:
-                # hard
-                if dfu >= 2 and dfu <= 3:
-                    return 13
-                if dfu >= 4 and dfu <= 6:
-                    return 12
-                if True: # dfu >= 7 or dfu == 1
-                    return 17
-            else:
-                # soft
-                if dfu >= 1 and dfu <= 8:
-                    return 18
-                if True: # dfu >= 9 and dfu <= 10
-                    return 19
-        def X_D(dfu, a):
-            x = []
-            if a == 0:
-                # hard
-                if dfu >= 2 and dfu <= 10:
-                    x += [11]
-                if dfu >= 2 and dfu <= 9:
-                    x += [10]
-                if dfu >= 2 and dfu <= 6:
-                    x += [9]
-            else:
-                # soft
-                if dfu >= 4 and dfu <= 6:
-                    x += [18]
-                if dfu >= 3 and dfu <= 6:
-                    x += [17]
-                if dfu >= 5 and dfu <= 6:
-                    x += [13,14,15,16]
-                if dfu == 5:
-                    x += [12]
-            return x
-        def Y_D (dfu):
-            y = [1,8]
-            if (dfu >= 2 and dfu <= 6) or dfu == 8 or dfu == 9:
-                y += [9]
-            if dfu >= 2 and dfu <= 8:
-                y += [7]
-            if dfu >= 2 and dfu <= 7:
-                y += [2,3,6]
-            if dfu == 5:
-                y += [4]
-            return y
-
-    elif strategy == "culbertson":
-        def M_D(dfu, a):
-            if a == 0:
-                if dfu >= 2 and dfu <= 6:
-                    return 14
-                if True: # dfu >= 7 or dfu == 1:
-                    return 16
-            else:
-                return 18
-        def X_D(dfu, a):
-            return []
-        def Y_D (dfu):
-            return [1]
+    # compiled strategy for a strategy name or strategy file (None for the optimal strategy)
+    def loadStrategy(strategy):
+        if strategy == "optimal":
+            # solved for once the dealer probabilities are known
+            return None
+        elif strategy.endswith(".json") or strategy.endswith(".csv"):
+            # strategy file
+            return Strategy.load(strategy)
+        elif strategy in Strategy.builtins:
+            # strategy chart shipped with the package
+            return Strategy.builtin(strategy)
+        else:
+            raise Exception("unknown strategy")
 
-    elif strategy == "mimicdealer":
-        # mimic dealer
-        def M_D(dfu, a):
-            return 17
-        def X_D(dfu, a):
-            return []
-        def Y_D (dfu):
-            return []
-        
-    else:
-        raise Exception("unknown strategy")
+    strategyTables = [loadStrategy(strategy) for strategy in strategies]
+    if opts.dealerDAG and (opts.multiset or opts.infiniteDeck):
+        optparser.error("--dealer-dag can't be used with --multiset or --infinite-deck")
+    if opts.infiniteDeck:
+        if None in strategyTables:
+            optparser.error("the optimal strategy can't be solved for with --infinite-deck")
+        if opts.multiset or opts.dealerCache:
+            optparser.error("--infinite-deck doesn't enumerate hands, so it can't be used with --multiset or --dealer-cache")
 
     
     # utility functions
     
     cards =      [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    deckCounts = [4, 4, 4, 4, 4, 4, 4, 4, 4, 16]
+    deckCounts = [4*opts.decks for c in range(9)] + [16*opts.decks]
+    if opts.shoe:
+        try:
+            deckCounts = [int(n) for n in opts.shoe.split(",")]
+        except ValueError:
+            optparser.error("shoe counts must be integers")
+        if len(deckCounts) != len(cards) or min(deckCounts) < 0:
+            optparser.error("shoe must have 10 non-negative counts (A,2,...,9,10)")
+    elif opts.decks < 1:
+        optparser.error("number of decks must be at least 1")
     deckCountTotal = sum(deckCounts)
+    cardProbs = [n/deckCountTotal for n in deckCounts] # draw probabilities with --infinite-deck
 
-    # number of times card c appears in hand h
-    def cardCount(hand, c):
-        n = 0
-        for k in hand:
-            if k == c:
-                n += 1
-        return n
-
-    # hand total t,a (total is soft if a > 0)
-    def handTotal(hand):
-        t = 0
-        a = 0
-        for c in hand:
-            t += c
-            if c == 1:
-                a = 1
-        if a and t < 12:
-            t += 10
-        else:
-            a = 0
-        return t,a
-
-    # probability of drawing a card given a set of already dealt cards
-    def drawProb1(dealt, c):
-        return (deckCounts[c-1]-cardCount(dealt,c))/(deckCountTotal-len(dealt))
-        
-    # probability of drawing a hand given a set of already dealt cards
-    def drawProb(dealt, hand):
-        p = 1.0
-        for i in range(len(hand)):
-            p = p*drawProb1(dealt+hand[0:i], hand[i])
-        return p
+    # hot path counters and timers (only installed with --profile)
+    profile = Profile("ewcalc.py", bool(opts.profile))
 
     # expand dealer partial hand
+    @profile.counted
     def expandDealerHand(h):
-        t,a = handTotal(h)
-        if t < 17:
+        if h.t < 17:
             xh = []
             for k in cards:
-                if cardCount(h, k) < deckCounts[k-1]:
-                    xh += expandDealerHand(h + [k])
+                if h.canDraw(k):
+                    xh += expandDealerHand(h.draw(k))
             return xh
         return [h]
 
-    # all unique dealer hands
-    dealerHands = [[] for dfu in cards]
-    for dfu in cards:
+    # multiset enumeration (--multiset)
+    #
+    # Every order of the same drawn cards has the same probability and ends on the same total, so
+    # hands can be enumerated as multisets of drawn cards (drawing in non-decreasing order) and
+    # weighted by the number of orders they can be drawn in. Only orders that don't stop before
+    # the last card count, since a hand that stands (or busts) early is a different hand. Without
+    # aces the totals only go up, so if nothing stops on the way to the final total every order is
+    # fine and the count is a multinomial coefficient. With a soft total an order can pass through a
+    # standing total on the way (A,6 stops the dealer where 6,10,A doesn't), so those counts are
+    # built up from the orders of the cards before the last one.
+
+    # total t,a after drawing cards S (counts by card) to total t0,a0
+    def multisetTotal(t0, a0, S):
+        h = t0 - 10*a0 + sum(c*S[c-1] for c in cards)
+        if (a0 or S[0]) and h <= 11:
+            return h+10, 1
+        return h, 0
+
+    # number of orders cards S can be drawn in to total t0,a0 without stopping on the way (or at
+    # the end), memoized in memo (one for each stopping rule)
+    def runningOrders(memo, stops, t0, a0, S):
+        key = (t0, a0, S)
+        if key not in memo:
+            if not any(S):
+                n = 1
+            elif stops(*multisetTotal(t0, a0, S)):
+                n = 0
+            elif a0 == 0 and S[0] == 0 and not any(stops(t, 0) for t in range(t0, multisetTotal(t0, a0, S)[0])):
+                n = math.factorial(sum(S))
+                for m in S:
+                    n //= math.factorial(m)
+            else:
+                n = 0
+                for c in cards:
+                    if S[c-1] > 0:
+                        n += runningOrders(memo, stops, t0, a0, removeCard(S, c))
+            memo[key] = n
+        return memo[key]
+
+    # number of orders cards S can be drawn in to total t0,a0 that only stop on the last card
+    def stoppingOrders(memo, stops, t0, a0, S):
+        n = 0
         for c in cards:
-            dealerHands[dfu-1] += expandDealerHand([dfu, c])
-    if opts.verbose:
-        print("\nunique dealer hands")
-        for dfu in cards:
-            print(dfu, len(dealerHands[dfu-1]))
+            if S[c-1] > 0:
+                n += runningOrders(memo, stops, t0, a0, removeCard(S, c))
+        return n
+
+    # final hands drawn to hand h until stops(t, a) is true (which it must be for busts), one for
+    # each multiset of drawn cards, with the number of orders it can be drawn in
+    #
+    # visits[i] counts the multisets visited.
+    def multisetHands(h, stops, memo, visits, i):
+        if stops(h.t, h.a):
+            visits[i] += 1
+            yield h, 1
+            return
+        # hard total from which every hand stops, so nothing more can be drawn to it
+        hardStop = 22
+        while hardStop > 0 and stops(hardStop-1, 0) and (hardStop-1 > 11 or stops(hardStop+9, 1)):
+            hardStop -= 1
+        def expand(hk, first):
+            visits[i] += 1
+            if stops(hk.t, hk.a):
+                S = tuple(n0 - n for n0,n in zip(h.counts, hk.counts))
+                w = stoppingOrders(memo, stops, h.t, h.a, S)
+                if w > 0:
+                    yield hk, w
+                if hk.t - 10*hk.a >= hardStop:
+                    return
+            for k in range(first, 11):
+                if hk.canDraw(k):
+                    yield from expand(hk.draw(k), k)
+        yield from expand(h, 1)
+
+    # infinite deck (--infinite-deck)
+    #
+    # When every card is drawn with the same probabilities, a hand's future only depends on its
+    # total, so the dealer total probabilities and the player's expected winnings are memoized by
+    # total (and whether it's soft) instead of being added up over every hand.
+
+    # probabilities of dealer final totals (busts are stored in 0) for a dealer partial total t,a
+    @profile.counted
+    @functools.lru_cache(maxsize=None)
+    def infiniteDealerTotals(t, a):
+        probs = [0.0 for t in range(22)]
+        if t >= 17:
+            probs[t] = 1.0 # dealer stands on 17
+            return probs
+        for c in cards:
+            tc,ac = addCard(t, a, c)
+            if tc > 21:
+                probs[0] += cardProbs[c-1] # bust
+            else:
+                ptc = infiniteDealerTotals(tc, ac)
+                for i in range(22):
+                    probs[i] += cardProbs[c-1]*ptc[i]
+        return probs
+
+    # probabilities of dealer totals for face up card dfu (busts are stored in 0, naturals are
+    # stored in 22)
+    def infiniteDealerTotalProbs(dfu):
+        probs = [0.0 for t in range(23)]
+        t,a = addCard(0, 0, dfu)
+        for c in cards:
+            tc,ac = addCard(t, a, c)
+            if tc == 21:
+                probs[22] += cardProbs[c-1] # natural
+            else:
+                ptc = infiniteDealerTotals(tc, ac)
+                for i in range(22):
+                    probs[i] += cardProbs[c-1]*ptc[i]
+        return probs
+
+    # dealer hand DAG (--dealer-dag)
+    #
+    # A dealer partial hand's final totals only depend on its total and the cards left in the shoe,
+    # not on the order its cards were drawn in, so partial hands are nodes keyed by (counts, t, a)
+    # that every order of the same cards shares (along with other face up cards that reach the
+    # same composition). Each node holds the number of hands below it and the probabilities of the
+    # final totals from it, built in one pass from the nodes one card on.
+    dealerNodes = {}
+    @profile.counted
+    def dealerNode(counts, t, a):
+        key = (counts, t, a)
+        node = dealerNodes.get(key)
+        if node is None:
+            hands = 0
+            probs = [0.0 for t in range(22)]
+            n = sum(counts)
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    if tk >= 17:
+                        hands += 1
+                        probs[0 if tk > 21 else tk] += nk/n # bust or total
+                    else:
+                        hk,pk = dealerNode(removeCard(counts, k), tk, ak)
+                        hands += hk
+                        for i in range(22):
+                            probs[i] += nk/n*pk[i]
+            node = (hands, probs)
+            dealerNodes[key] = node
+        return node
+
+    # number of dealer hands and probabilities of dealer totals (busts are stored in 0, naturals
+    # are stored in 22) for face up card dfu from the DAG
+    def dealerDAGTotalProbs(dfu):
+        hands = 0
+        probs = [0.0 for t in range(23)]
+        h = Hand(deckCounts, [dfu])
+        for c in cards:
+            if h.canDraw(c):
+                hc = h.draw(c)
+                if hc.t == 21:
+                    hands += 1
+                    probs[22] += hc.p # natural
+                elif hc.t >= 17:
+                    hands += 1
+                    probs[hc.t] += hc.p # total
+                else:
+                    nc,pc = dealerNode(hc.counts, hc.t, hc.a)
+                    hands += nc
+                    for i in range(22):
+                        probs[i] += hc.p*pc[i]
+        return hands, probs
+
+    # dealer face up cards that can be dealt from the shoe
+    dfus = [dfu for dfu in cards if deckCounts[dfu-1] > 0]
+    if opts.dfu:
+        dfus = [opts.dfu]
+
+    # dealer rules the dealer tables depend on
+    dealerRules = "stand on 17"
+
+    # persistent cache of the dealer tables for each face up card (number of unique hands, total
+    # hand probability, then the dealer total probabilities)
+    dealerCache = None
+    if opts.dealerCache:
+        dealerCache = DealerCache(opts.dealerCache, "ewcalc", dealerRules, deckCounts)
+
+    # all unique dealer hands (not needed for face up cards found in the dealer cache)
+    dealerHands = [[] for dfu in cards]
+    dealerHandWeights = [[] for dfu in cards]
+    dealerHandCounts = [0 for dfu in cards]
+    dealerMultisets = [0 for dfu in cards]
+    dealerVisits = [0 for dfu in cards]
+    dealerMemo = {}
+    dealerHandProbs = [0.0 for dfu in cards]
+    dealerTotalProbs = [[0 for t in range(23)] for dfu in cards]
+    dealerSeconds = [0.0 for dfu in cards]
+    dealerBytes = [0 for dfu in cards]
+    dealerSeen = set() # DAG nodes already measured
+    cachedDfus = []
+    for dfu in dfus:
+        cached = dealerCache.get((dfu,)) if dealerCache is not None else None
+        if cached is not None:
+            dealerHandCounts[dfu-1] = cached[0]
+            dealerHandProbs[dfu-1] = cached[1]
+            dealerTotalProbs[dfu-1] = cached[2:]
+            cachedDfus.append(dfu)
+            continue
+        profile.phase("dealer hands", dfu)
+        if opts.infiniteDeck:
+            continue # no hands, the totals are worked out below
+        start = time.perf_counter()
+        if opts.dealerDAG:
+            nodes = len(dealerNodes)
+            dealerHandCounts[dfu-1],dealerTotalProbs[dfu-1] = dealerDAGTotalProbs(dfu)
+            dealerHandProbs[dfu-1] = sum(dealerTotalProbs[dfu-1])
+            dealerSeconds[dfu-1] = time.perf_counter() - start
+            if opts.verbose:
+                dealerBytes[dfu-1] = sum(retainedSize(node, dealerSeen) for node in list(dealerNodes.items())[nodes:])
+            continue
+        if opts.multiset:
+            for h,w in multisetHands(Hand(deckCounts, [dfu]), lambda t, a: t >= 17, dealerMemo, dealerVisits, dfu-1):
+                dealerHands[dfu-1].append(h)
+                dealerHandWeights[dfu-1].append(w)
+            dealerMultisets[dfu-1] = len(dealerHands[dfu-1])
+        else:
+            for c in cards:
+                h = Hand(deckCounts, [dfu])
+                if h.canDraw(c):
+                    dealerHands[dfu-1] += expandDealerHand(h.draw(c))
+            dealerHandWeights[dfu-1] = [1 for h in dealerHands[dfu-1]]
+        dealerHandCounts[dfu-1] = sum(dealerHandWeights[dfu-1])
+        for h,w in zip(dealerHands[dfu-1], dealerHandWeights[dfu-1]):
+            dealerHandProbs[dfu-1] += h.p*w
+        dealerSeconds[dfu-1] = time.perf_counter() - start
+        if opts.verbose:
+            seen = set() # hands aren't shared between face up cards
+            dealerBytes[dfu-1] = retainedSize(dealerHands[dfu-1], seen) + retainedSize(dealerHandWeights[dfu-1], seen)
+    if opts.verbose and not opts.infiniteDeck:
+        if opts.multiset:
+            print("\nunique dealer hands (ordered, multisets, multisets visited)")
+            for dfu in cards:
+                print(dfu, dealerHandCounts[dfu-1], dealerMultisets[dfu-1], dealerVisits[dfu-1])
+        else:
+            print("\nunique dealer hands")
+            for dfu in cards:
+                print(dfu, dealerHandCounts[dfu-1])
         print("total dealer hand prob")
         for dfu in cards:
-            p = 0.0
-            for h in  dealerHands[dfu-1]:
-                p += drawProb([dfu], h[1:])
-            print(dfu,p)
+            print(dfu,dealerHandProbs[dfu-1])
 
     # probabilities of dealer totals by face up card (busts are stored in 0, naturals are stored in 22)
-    dealerTotalProbs = [[0 for t in range(23)] for dfu in cards]
+    profile.phase("dealer tables")
     for dfu in cards:
-        for h in dealerHands[dfu-1]:
-            t,a = handTotal(h) # hand total
-            p = drawProb([dfu], h[1:])
+        start = time.perf_counter()
+        for h,w in zip(dealerHands[dfu-1], dealerHandWeights[dfu-1]):
+            t = h.t # hand total
+            p = h.p*w
             if t > 21:
                 dealerTotalProbs[dfu-1][0] += p # bust
-            elif len(h) == 2 and t == 21:
+            elif len(h.cards) == 2 and t == 21:
                 dealerTotalProbs[dfu-1][22] += p # natural
             else:
                 dealerTotalProbs[dfu-1][t] += p # total
+        dealerSeconds[dfu-1] += time.perf_counter() - start
+    if opts.verbose and not opts.infiniteDeck:
+        if opts.dealerDAG:
+            print("\ndealer hand DAG nodes:", len(dealerNodes))
+        print("\ndealer hand storage by face up card (seconds, MB)")
+        for dfu in cards:
+            print(dfu, round(dealerSeconds[dfu-1], 4), round(dealerBytes[dfu-1]/2**20, 3))
+    if opts.infiniteDeck:
+        for dfu in dfus:
+            dealerTotalProbs[dfu-1] = infiniteDealerTotalProbs(dfu)
+        if opts.verbose:
+            print("\ndealer total states:", infiniteDealerTotals.cache_info().currsize)
+    if dealerCache is not None:
+        for dfu in dfus:
+            if dfu not in cachedDfus:
+                dealerCache.put((dfu,), [dealerHandCounts[dfu-1], dealerHandProbs[dfu-1]] + dealerTotalProbs[dfu-1])
+        if opts.verbose:
+            print("\ndealer cache face up cards loaded:",cachedDfus,"new:",len(dealerCache.new))
+        dealerCache.flush()
     if opts.verbose:
         print("\ndealer total probabilities bust(0) 1 to 21 natural(22)")
         for dfu in cards:
@@ -240,99 +449,453 @@ def main(argv):
             p += dealerTotalProbsNoNatural[dfu-1][i]
         return p
 
-    def cardsRemaining(dfu, s, h, k):
-        return cardCount(h, k) < deckCounts[k-1] - (1 if dfu == k else 0) - (1 if s == k else 0)
-
-    # expand player partial hand using basic strategy
-    def expandPlayerHand(dfu, s, b, h):
-        t,a = handTotal(h)
-        # splitting
-        if s == 0 and len(h) == 2 and h[0] == h[1]:
-            if h[0] in Y_D(dfu):
-                if h[0] == 1:
-                    xh = []
-                    for k in cards:
-                        if cardsRemaining(dfu, s, h, k):
-                            xh += [[h[0], b, h[0:1] + [k]]]
-                    return xh
+    # expected winnings for a final player hand with total t and bet b
+    def ewHand(dfu, t, b, natural):
+        w = 0.0
+        if t > 21:
+            # player loses b on bust
+            w -= b
+        elif t < 17:
+            # player wins b on dealer bust
+            w += b*probDealerNoNatural(dfu)*probDealerNoNaturalBust(dfu)
+            # player loses b on all other possible dealer totals (dealer stands on 17)
+            w -= b*probDealerNoNatural(dfu)*(1.0-probDealerNoNaturalBust(dfu))
+        elif natural:
+            # player wins 1.5*b on a natural if dealer doesn't have a natural
+            w += 1.5*b*probDealerNoNatural(dfu)
+        else:
+            # player loses b if dealer has a natural
+            w -= b*probDealerNatural(dfu)
+            # player wins b if dealer doesn't have a natural and dealer busts
+            w += b*probDealerNoNatural(dfu)*probDealerNoNaturalBust(dfu)
+            # player wins b if dealer doesn't have a natural and dealer total is less than t
+            w += b*probDealerNoNatural(dfu)*probDealerNoNaturalTotalLessThan(dfu,t)
+            # player loses b if dealer doesn't have a natural and dealer total is greater than t
+            w -= b*probDealerNoNatural(dfu)*probDealerNoNaturalTotalGreaterThan(dfu,t)
+        return w
+
+    # optimal strategy solver
+    #
+    # The expected winnings maximizing decisions are found by dynamic programming over hand states
+    # (memoized by the composition of the shoe the player draws from). They are then summarized in
+    # M(D), M*(D), X(D), Y(D) form by adding up the advantage of each decision over every hand state
+    # where it comes up, weighted by the probability of reaching that state.
+    #
+    # Final hands are scored given that the dealer doesn't have a natural (the player loses those
+    # before making any decisions), the same way for every total. That scales all of the choices at
+    # a hand state by the same probability and leaves the best one unchanged. (ewHand charges the
+    # dealer natural to totals of 17 or more but not to lower ones, which the solver would take
+    # advantage of, standing on low totals to dodge the charge.)
+
+    # expected winnings for a final player hand with total t and bet b given that the dealer doesn't
+    # have a natural
+    def ewHandNoNatural(dfu, t, b):
+        if t > 21:
+            return -b # player loses b on bust
+        # player wins b on dealer bust or a dealer total less than t, loses b on a dealer total
+        # greater than t
+        return b*(probDealerNoNaturalBust(dfu) + probDealerNoNaturalTotalLessThan(dfu, t) - probDealerNoNaturalTotalGreaterThan(dfu, t))
+
+    # expected winnings per unit bet for standing, hitting and doubling (None where not allowed)
+    # a player partial hand with total t,a (n2 if it has two cards) and the remaining shoe counts
+    @profile.counted
+    @functools.lru_cache(maxsize=None)
+    def actionEWs(dfu, counts, t, a, n2):
+        stand = ewHandNoNatural(dfu, t, 1)
+        hit = None
+        double = None
+        if t < 21:
+            n = sum(counts)
+            hit = 0.0
+            if n2:
+                double = 0.0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    hit += nk/n*bestEW(dfu, removeCard(counts, k), tk, ak, False)
+                    if n2:
+                        double += nk/n*ewHandNoNatural(dfu, tk, 2)
+        return stand, hit, double
+
+    # expected winnings per unit bet for the best play of a player partial hand
+    def bestEW(dfu, counts, t, a, n2):
+        if t > 21:
+            return -1.0 # bust
+        return max(ew for ew in actionEWs(dfu, counts, t, a, n2) if ew is not None)
+
+    # expected winnings per unit bet for splitting pair hand h (twice one half of the split)
+    def splitEW(dfu, h):
+        sh = h.split()
+        ew = 0.0
+        for k in cards:
+            if sh.canDraw(k):
+                hk = sh.draw(k)
+                pk = sh.counts[k-1]/sh.left
+                if h.cards[0] == 1:
+                    # split aces get one card each
+                    ew += pk*ewHandNoNatural(dfu, hk.t, 1)
                 else:
-                    xh = []
+                    ew += pk*bestEW(dfu, hk.counts, hk.t, hk.a, True)
+        return 2*ew
+
+    # solve for the optimal strategy and return it compiled like any other strategy
+    def solveStrategy():
+        standing = [[0, 0] for dfu in cards]
+        doubles = [[[], []] for dfu in cards]
+        splits = [[] for dfu in cards]
+        for dfu in dfus:
+            # advantage (and total weight) of hitting over standing, doubling over the best other
+            # play and splitting over not splitting by total t,a and pair card
+            hitMargins = [[0.0 for t in range(22)] for a in range(2)]
+            hitWeights = [[0.0 for t in range(22)] for a in range(2)]
+            doubleMargins = [[0.0 for t in range(22)] for a in range(2)]
+            splitMargins = [0.0 for c in cards]
+            # hand states (counts, t, a, n2) still being played, with their probabilities
+            states = {}
+            def addState(counts, t, a, n2, p):
+                states[(counts, t, a, n2)] = states.get((counts, t, a, n2), 0.0) + p
+            for i in cards:
+                for j in cards:
+                    h = Hand(deckCounts).remove(dfu)
+                    if not h.canDraw(i) or not h.draw(i).canDraw(j):
+                        continue
+                    h = h.draw(i).draw(j)
+                    if h.t == 21:
+                        continue # natural
+                    ew = bestEW(dfu, h.counts, h.t, h.a, True)
+                    if i == j:
+                        ews = splitEW(dfu, h)
+                        splitMargins[i-1] += h.p*(ews - ew)
+                        if ews > ew:
+                            if i != 1:
+                                # both halves of the split are played on
+                                sh = h.split()
+                                for k in cards:
+                                    if sh.canDraw(k):
+                                        hk = sh.draw(k)
+                                        addState(hk.counts, hk.t, hk.a, True, 2*h.p*sh.counts[k-1]/sh.left)
+                            continue
+                    addState(h.counts, h.t, h.a, True, h.p)
+            # follow the best play one card at a time, merging states with the same composition
+            while states:
+                nextStates = states
+                states = {}
+                for (counts, t, a, n2), p in nextStates.items():
+                    stand,hit,double = actionEWs(dfu, counts, t, a, n2)
+                    if hit is None:
+                        continue
+                    if double is not None:
+                        doubleMargins[a][t] += p*(double - max(stand, hit))
+                        if double > max(stand, hit):
+                            continue
+                    hitMargins[a][t] += p*(hit - stand)
+                    hitWeights[a][t] += p
+                    if hit > stand:
+                        n = sum(counts)
+                        for k in cards:
+                            nk = counts[k-1]
+                            if nk > 0:
+                                tk,ak = addCard(t, a, k)
+                                if tk <= 21:
+                                    addState(removeCard(counts, k), tk, ak, False, p*nk/n)
+            # stand on totals above the highest total where hitting comes out ahead
+            for a in range(2):
+                hits = [t for t in range(22) if hitWeights[a][t] > 0 and hitMargins[a][t] > 0]
+                standing[dfu-1][a] = (max(hits)+1) if hits else (12 if a else 4)
+                doubles[dfu-1][a] = [t for t in range(22) if doubleMargins[a][t] > 0]
+            splits[dfu-1] = [c for c in cards if splitMargins[c-1] > 0]
+        print("optimal strategy")
+        print("dfu M(D) M*(D) X(D)hard X(D)soft Y(D)")
+        for dfu in dfus:
+            print(dfu, standing[dfu-1][0], standing[dfu-1][1], doubles[dfu-1][0], doubles[dfu-1][1], splits[dfu-1])
+        if opts.verbose:
+            print("solver cache", actionEWs.cache_info())
+        def M_D(dfu, a):
+            return standing[dfu-1][a]
+        def X_D(dfu, a):
+            return doubles[dfu-1][a]
+        def Y_D(dfu):
+            return splits[dfu-1]
+        return Strategy("optimal", M_D, X_D, Y_D)
+
+    # expected winnings by dealer face up card for a strategy with --infinite-deck, played the same
+    # way as the hands expanded by evaluateStrategy
+    def evaluateStrategyInfinite(strategy):
+        # expected winnings per unit bet for a player partial hand with total t,a (n2 if it has two
+        # cards and can still be doubled down)
+        @profile.counted
+        @functools.lru_cache(maxsize=None)
+        def playerEW(dfu, t, a, n2):
+            # doubling
+            if n2 and strategy.double(dfu, t, a):
+                ew = 0.0
+                for k in cards:
+                    tk,ak = addCard(t, a, k)
+                    ew += cardProbs[k-1]*ewHand(dfu, tk, 2, False)
+                return ew
+            # hitting
+            if strategy.hit(dfu, t, a):
+                ew = 0.0
+                for k in cards:
+                    tk,ak = addCard(t, a, k)
+                    ew += cardProbs[k-1]*playerEW(dfu, tk, ak, False)
+                return ew
+            return ewHand(dfu, t, 1, False)
+
+        expectedWinnings = [0.0 for dfu in cards]
+        for dfu in dfus:
+            profile.phase("player hands", dfu)
+            for i in cards:
+                for j in cards:
+                    p = cardProbs[i-1]*cardProbs[j-1]
+                    t,a = addCard(*addCard(0, 0, i), j)
+                    if i == j and strategy.split(dfu, i):
+                        # splitting, twice one half of the split
+                        ew = 0.0
+                        for k in cards:
+                            tk,ak = addCard(*addCard(0, 0, i), k)
+                            if i == 1:
+                                # split aces get one card each
+                                ew += cardProbs[k-1]*ewHand(dfu, tk, 1, False)
+                            else:
+                                ew += cardProbs[k-1]*playerEW(dfu, tk, ak, True)
+                        expectedWinnings[dfu-1] += p*2*ew
+                    elif t == 21:
+                        expectedWinnings[dfu-1] += p*ewHand(dfu, t, 1, True)
+                    else:
+                        expectedWinnings[dfu-1] += p*playerEW(dfu, t, a, True)
+        if opts.verbose:
+            print("\nplayer total states:", playerEW.cache_info().currsize)
+        return expectedWinnings
+
+    # expected winnings by dealer face up card for a strategy
+    #
+    # Only the player side depends on the strategy, so in a batch everything above is shared.
+    def evaluateStrategy(strategy):
+        # expand player partial hand using basic strategy, yielding the final hands w/bets one at a
+        # time so that memory stays flat however many hands the shoe allows
+        @profile.counted
+        def expandPlayerHand(dfu, s, b, h):
+            t,a = h.t,h.a
+            # splitting
+            if s == 0 and len(h.cards) == 2 and h.cards[0] == h.cards[1]:
+                if strategy.split(dfu, h.cards[0]):
+                    sh = h.split()
+                    for k in cards:
+                        if sh.canDraw(k):
+                            if h.cards[0] == 1:
+                                yield h.cards[0], b, sh.draw(k)
+                            else:
+                                yield from expandPlayerHand(dfu, h.cards[0], b, sh.draw(k))
+                    return
+            # doubling
+            if len(h.cards) == 2:
+                if strategy.double(dfu, t, a):
                     for k in cards:
-                        if cardsRemaining(dfu, s, h, k):
-                            xh += expandPlayerHand(dfu, h[0], b, h[0:1] + [k])
-                    return xh
-        # doubling
-        if len(h) == 2:
-            if t in X_D(dfu, a):
-                xh = []
+                        if h.canDraw(k):
+                            yield s, b*2, h.draw(k)
+                    return
+            # hitting
+            if strategy.hit(dfu, t, a):
                 for k in cards:
-                    if cardsRemaining(dfu, s, h, k):
-                        xh += [[s, b*2, h + [k]]]
-                return xh
-        # hitting
-        if t < M_D(dfu, a):
-            xh = []
-            for k in cards:
-                if cardsRemaining(dfu, s, h, k):
-                    xh += expandPlayerHand(dfu, s, b, h + [k])
-            return xh
-        return [[s, b, h]]
+                    if h.canDraw(k):
+                        yield from expandPlayerHand(dfu, s, b, h.draw(k))
+                return
+            yield s, b, h
 
-    # all unique player hands w/bets by dealer face up card
-    playerHands = [[] for dfu in cards]
-    for dfu in cards:
-        for i in cards:
-            for j in cards:
-                playerHands[dfu-1] += expandPlayerHand(dfu, 0, 1, [i, j])
-    if opts.verbose:
-        print("\nunique player hands")
-        for dfu in cards:
-            print(dfu, len(playerHands[dfu-1]))
-        print("total player hand prob")
-        for dfu in cards:
-            p = 0.0
-            for s,b,h in playerHands[dfu-1]:
-                if  s == 0:
-                    p += drawProb([dfu], h)
-                else:
-                    p += drawProb([dfu], [s, s])*drawProb([dfu, s, s], h[1:])
-            print(dfu,p)
+        # expand player partial hand as above, yielding the final hands w/bets and the number of
+        # orders they can be drawn in (--multiset)
+        playerMemos = {dfu: {} for dfu in cards}
+        def expandPlayerMultisets(dfu, s, b, h):
+            t,a = h.t,h.a
+            # splitting
+            if s == 0 and len(h.cards) == 2 and h.cards[0] == h.cards[1]:
+                if strategy.split(dfu, h.cards[0]):
+                    sh = h.split()
+                    for k in cards:
+                        if sh.canDraw(k):
+                            if h.cards[0] == 1:
+                                playerVisits[dfu-1] += 1
+                                yield h.cards[0], b, sh.draw(k), 1
+                            else:
+                                yield from expandPlayerMultisets(dfu, h.cards[0], b, sh.draw(k))
+                    return
+            # doubling
+            if len(h.cards) == 2:
+                if strategy.double(dfu, t, a):
+                    for k in cards:
+                        if h.canDraw(k):
+                            playerVisits[dfu-1] += 1
+                            yield s, b*2, h.draw(k), 1
+                    return
+            # hitting
+            stops = lambda t, a: t > 21 or not strategy.hit(dfu, t, a)
+            for hk,w in multisetHands(h, stops, playerMemos[dfu], playerVisits, dfu-1):
+                yield s, b, hk, w
 
-    # compute expected winnings
-    print("expected winnings by dealer face up card")
-    expectedWinnings = [0.0 for dfu in cards]
-    overallExpectedWinnings = 0.0
-    for dfu in cards:
-        for i in range(len(playerHands[dfu-1])):
-            s,b,h = playerHands[dfu-1][i]
-            t,a = handTotal(h)
-            p = drawProb([dfu], ([s] if s > 0 else []) + h)
-            w = 0.0
-            if t > 21:
-                # player loses b on bust
-                w -= b
-            elif t < 17:
-                # player wins b on dealer bust
-                w += b*probDealerNoNatural(dfu)*probDealerNoNaturalBust(dfu)
-                # player loses b on all other possible dealer totals (dealer stands on 17)
-                w -= b*probDealerNoNatural(dfu)*(1.0-probDealerNoNaturalBust(dfu))
-            elif s == 0 and len(h) == 2 and t == 21:
-                # player wins 1.5*b on a natural if dealer doesn't have a natural
-                w += 1.5*b*probDealerNoNatural(dfu)
+        # play of the player's first two cards i,j against dealer face up card dfu
+        def firstPlay(dfu, i, j):
+            t,a = addCard(*addCard(0, 0, i), j)
+            if i == j and strategy.split(dfu, i):
+                return "split"
+            if strategy.double(dfu, t, a):
+                return "double"
+            return "hit" if strategy.hit(dfu, t, a) else "stand"
+
+        # final player hands that are hit or stood on from the first two cards (not split or
+        # doubled), one for each multiset of the player's cards with the number of orders they can
+        # be dealt and drawn in (--multiset)
+        #
+        # The multisets are of the whole hand, first two cards included, so the same cards dealt in
+        # any order are one hand (10,2 drawing 5 and 5,2 drawing 10 are both 2,5,10). An order counts
+        # if its first two cards are hit (or stood on, for a two card hand) and it doesn't stop
+        # before the last card. A multiset's total doesn't depend on the order, so the number of
+        # orders of each partial hand is memoized by its cards alone.
+        def playerHitMultisets(dfu):
+            h0 = Hand(deckCounts).remove(dfu)
+            stops = lambda t, a: t > 21 or not strategy.hit(dfu, t, a)
+            def handCards(T):
+                return [c for c in cards for n in range(T[c-1])]
+            memo = {}
+            # number of orders cards T can be dealt in (two or more) without stopping
+            def hitOrders(T):
+                if T not in memo:
+                    if sum(T) == 2:
+                        n = (2 if max(T) == 1 else 1) if firstPlay(dfu, *handCards(T)) == "hit" else 0
+                    elif stops(*multisetTotal(0, 0, T)):
+                        n = 0
+                    else:
+                        n = sum(hitOrders(removeCard(T, c)) for c in cards if T[c-1] > 0)
+                    memo[T] = n
+                return memo[T]
+            # hard total from which every hand stops (as in multisetHands)
+            hardStop = 22
+            while hardStop > 0 and stops(hardStop-1, 0) and (hardStop-1 > 11 or stops(hardStop+9, 1)):
+                hardStop -= 1
+            def expand(h, first):
+                playerVisits[dfu-1] += 1
+                m = len(h.cards)
+                if m >= 2 and stops(h.t, h.a):
+                    T = tuple(n0 - n for n0,n in zip(h0.counts, h.counts))
+                    if m == 2:
+                        w = (2 if max(T) == 1 else 1) if firstPlay(dfu, *handCards(T)) == "stand" else 0
+                    else:
+                        w = sum(hitOrders(removeCard(T, c)) for c in cards if T[c-1] > 0)
+                    if w > 0:
+                        yield h, w
+                    if h.t - 10*h.a >= hardStop:
+                        # no more cards can be drawn to any order of a multiset with these cards
+                        return
+                for k in range(first, 11):
+                    if h.canDraw(k):
+                        yield from expand(h.draw(k), k)
+            yield from expand(h0, 1)
+
+        # compute expected winnings, streaming the unique player hands w/bets by dealer face up card
+        expectedWinnings = [0.0 for dfu in cards]
+        handCounts = [0 for dfu in cards]
+        handProbs = [0.0 for dfu in cards]
+        playerMultisets = [0 for dfu in cards]
+        playerVisits = [0 for dfu in cards]
+        # add final hands w/bets and the number of orders they can be drawn in
+        def addHands(dfu, hands):
+            for s,b,h,n in hands:
+                t = h.t
+                p = h.p*n
+                handCounts[dfu-1] += n
+                playerMultisets[dfu-1] += 1
+                handProbs[dfu-1] += p
+                w = ewHand(dfu, t, b, s == 0 and len(h.cards) == 2 and t == 21)
+                expectedWinnings[dfu-1] += p*w*(2 if s > 0 else 1)
+        for dfu in dfus:
+            profile.phase("player hands", dfu)
+            for i in cards:
+                for j in cards:
+                    ph = Hand(deckCounts).remove(dfu)
+                    if ph.canDraw(i) and ph.draw(i).canDraw(j):
+                        if opts.multiset:
+                            # the pair i,j is dealt either way round, and hands that are hit or
+                            # stood on are enumerated together below
+                            if j > i or firstPlay(dfu, i, j) in ("hit", "stand"):
+                                continue
+                            addHands(dfu, ((s, b, h, w*(1 if i == j else 2)) for s,b,h,w in expandPlayerMultisets(dfu, 0, 1, ph.draw(i).draw(j))))
+                        else:
+                            addHands(dfu, ((s, b, h, 1) for s,b,h in expandPlayerHand(dfu, 0, 1, ph.draw(i).draw(j))))
+            if opts.multiset:
+                addHands(dfu, ((0, 1, h, w) for h,w in playerHitMultisets(dfu)))
+        if opts.verbose:
+            if opts.multiset:
+                print("\nunique player hands (ordered, multisets, multisets visited)")
+                for dfu in cards:
+                    print(dfu, handCounts[dfu-1], playerMultisets[dfu-1], playerVisits[dfu-1])
             else:
-                # player loses b if dealer has a natural
-                w -= b*probDealerNatural(dfu)
-                # player wins b if dealer doesn't have a natural and dealer busts
-                w += b*probDealerNoNatural(dfu)*probDealerNoNaturalBust(dfu)
-                # player wins b if dealer doesn't have a natural and dealer total is less than t
-                w += b*probDealerNoNatural(dfu)*probDealerNoNaturalTotalLessThan(dfu,t)
-                # player loses b if dealer doesn't have a natural and dealer total is greater than t
-                w -= b*probDealerNoNatural(dfu)*probDealerNoNaturalTotalGreaterThan(dfu,t)
-            expectedWinnings[dfu-1] += p*w*(2 if s > 0 else 1)
-        print(dfu, expectedWinnings[dfu-1])
-        overallExpectedWinnings += expectedWinnings[dfu-1]*deckCounts[dfu-1]/deckCountTotal
-    print("overall expected winnings")
-    print(overallExpectedWinnings)
+                print("\nunique player hands")
+                for dfu in cards:
+                    print(dfu, handCounts[dfu-1])
+            print("total player hand prob")
+            for dfu in cards:
+                print(dfu,handProbs[dfu-1])
+        return expectedWinnings
+
+    reported = dfus if opts.dfu else cards
+    results = []
+    for strategy,tables in zip(strategies, strategyTables):
+        start = time.perf_counter()
+        if tables is None:
+            profile.phase("solver")
+            tables = solveStrategy()
+        expectedWinnings = evaluateStrategyInfinite(tables) if opts.infiniteDeck else evaluateStrategy(tables)
+        profile.phase("output")
+        overallExpectedWinnings = 0.0
+        for dfu in reported:
+            overallExpectedWinnings += expectedWinnings[dfu-1]*deckCounts[dfu-1]/deckCountTotal
+        results.append((strategy, expectedWinnings, overallExpectedWinnings))
+        if batch:
+            if opts.verbose:
+                print(strategy, "seconds:", round(time.perf_counter() - start, 3))
+            continue
+        print("expected winnings by dealer face up card")
+        for dfu in reported:
+            print(dfu, expectedWinnings[dfu-1])
+        if not opts.dfu:
+            print("overall expected winnings")
+            print(overallExpectedWinnings)
+
+    # comparison table for a batch
+    if batch:
+        print("expected winnings by strategy and dealer face up card")
+        width = max(len(strategy) for strategy in strategies)
+        print(" ".join(["strategy".ljust(width)] + [str(dfu).rjust(9) for dfu in reported] + (["overall".rjust(9)] if not opts.dfu else [])))
+        for strategy,expectedWinnings,overallExpectedWinnings in results:
+            row = [strategy.ljust(width)] + ["%9.6f" % expectedWinnings[dfu-1] for dfu in reported]
+            if not opts.dfu:
+                row.append("%9.6f" % overallExpectedWinnings)
+            print(" ".join(row))
+
+    if opts.verbose:
+        print("peak memory (MB):", round(peakMemory()/2**20, 1))
+    if profile.enabled:
+        profile.save(opts.profile)
+
+# memory held by obj and the tuples, lists, dicts and hands it refers to, in bytes, not counting
+# objects already in seen (which are added to it)
+def retainedSize(obj, seen):
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (list, tuple)):
+        size += sum(retainedSize(x, seen) for x in obj)
+    elif isinstance(obj, dict):
+        size += sum(retainedSize(k, seen) + retainedSize(v, seen) for k,v in obj.items())
+    elif isinstance(obj, Hand):
+        size += sum(retainedSize(getattr(obj, s), seen) for s in Hand.__slots__)
+    return size
+
+# peak resident memory of the process and any child processes, in bytes
+def peakMemory():
+    return 1024*max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
 
 if __name__ == '__main__':
     main(sys.argv)
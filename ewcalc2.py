@@ -29,17 +29,60 @@ import sys
 from optparse import OptionParser
 
 import math
+import functools
+import multiprocessing
+import time
+import resource
+from fractions import Fraction
+
+from blackjack.hand import addCard, removeCard, Hand
+from blackjack.rules import Rules
+from blackjack.shoe import Shoe
+from blackjack.strategy import Strategy
+from blackjack.engine import DependentEngine
+from blackjack.profile import Profile
 
 
 def main(argv):
     optparser = OptionParser("usage: %prog [options] strategy")
     optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
     optparser.add_option("-d", "--dfu", action="store", type="int", dest="dfu", default=0, help="dealer face up card to analyze (default all)")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=500000, help="maximum number of cached dealer total distributions (default 500000, 0 for unlimited)")
+    optparser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1, help="number of worker processes (default 1)")
+    optparser.add_option("--exact-split", action="store_true", dest="exactSplit", default=False, help="evaluate split hands exactly, playing every hand of the split from the same shoe (reports the values from twice one half of the split as well, which only differ with --resplit)")
+    optparser.add_option("--resplit", action="store", type="int", dest="resplit", default=2, help="maximum number of hands from splitting and resplitting a pair, except aces (default 2, requires --exact-split)")
+    optparser.add_option("--no-das", action="store_false", dest="das", default=True, help="don't allow doubling down after splitting a pair")
+    optparser.add_option("--enumerate", action="store_true", dest="enumerate", default=False, help="evaluate every unique dealer hand against every player hand (slow reference calculation)")
+    optparser.add_option("--exact", action="store_true", dest="exact", default=False, help="evaluate with exact rational arithmetic and print the expected winnings as fractions as well")
+    optparser.add_option("--dealer-cache", action="store", type="string", dest="dealerCache", default="", help="SQLite file to keep dealer total probabilities in between runs (default none)")
+    optparser.add_option("--profile", action="store", type="string", dest="profile", default="", help="write a JSON profile report (call counts, zero probability skips, seconds by phase and dealer face up card) to a file and print a summary")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
     (opts, args) = optparser.parse_args()
 
+    if opts.resplit < 2:
+        optparser.error("resplit must allow at least 2 hands")
+    if opts.resplit > 2 and not opts.exactSplit:
+        optparser.error("--resplit requires --exact-split")
+    if opts.exactSplit and opts.enumerate:
+        optparser.error("--exact-split is not supported with --enumerate")
+    if opts.exact and (opts.exactSplit or opts.enumerate):
+        optparser.error("--exact is not supported with --exact-split or --enumerate")
+
     if opts.verbose:
         print("verbose:",opts.verbose)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
         print("dfu:",opts.dfu)
+        print("cacheSize:",opts.cacheSize)
+        print("jobs:",opts.jobs)
+        print("exactSplit:",opts.exactSplit)
+        print("resplit:",opts.resplit)
+        print("das:",opts.das)
+        print("enumerate:",opts.enumerate)
+        print("exact:",opts.exact)
+        print("dealerCache:",opts.dealerCache)
+        print("profile:",opts.profile)
         print("args:",args)
         
     strategy = "baldwin-optimum"
@@ -47,245 +90,631 @@ def main(argv):
         strategy = args.pop()
     print("Using strategy:",strategy)
 
-    if strategy == "baldwin-optimum":
-        def M_D(dfu, a):
-            if a == 0:
-                # hard
-                if dfu >= 2 and dfu <= 3:
-                    return 13
-                if dfu >= 4 and dfu <= 6:
-                    return 12
-                if True: # dfu >= 7 or dfu == 1
-                    return 17
-            else:
-                # soft
-                if dfu >= 1 and dfu <= 8:
-                    return 18
-                if True: # dfu >= 9 and dfu <= 10
-                    return 19
-        def X_D(dfu, a):
-            x = []
-            if a == 0:
-                # hard
-                if dfu >= 2 and dfu <= 10:
-                    x += [11]
-                if dfu >= 2 and dfu <= 9:
-                    x += [10]
-                if dfu >= 2 and dfu <= 6:
-                    x += [9]
-            else:
-                # soft
-                if dfu >= 4 and dfu <= 6:
-                    x += [18]
-                if dfu >= 3 and dfu <= 6:
-                    x += [17]
-                if dfu >= 5 and dfu <= 6:
-                    x += [13,14,15,16]
-                if dfu == 5:
-                    x += [12]
-            return x
-        def Y_D (dfu):
-            y = [1,8]
-            if (dfu >= 2 and dfu <= 6) or dfu == 8 or dfu == 9:
-                y += [9]
-            if dfu >= 2 and dfu <= 8:
-                y += [7]
-            if dfu >= 2 and dfu <= 7:
-                y += [2,3,6]
-            if dfu == 5:
-                y += [4]
-            return y
-
-    elif strategy == "culbertson":
-        def M_D(dfu, a):
-            if a == 0:
-                if dfu >= 2 and dfu <= 6:
-                    return 14
-                if True: # dfu >= 7 or dfu == 1:
-                    return 16
-            else:
-                return 18
-        def X_D(dfu, a):
-            return []
-        def Y_D (dfu):
-            return [1]
-
-    elif strategy == "mimicdealer":
-        # mimic dealer
-        def M_D(dfu, a):
-            return 17
-        def X_D(dfu, a):
-            return []
-        def Y_D (dfu):
-            return []
-        
+    # compiled strategy tables
+    if strategy == "optimal":
+        # solved for before the evaluation
+        tables = None
+    elif strategy.endswith(".json") or strategy.endswith(".csv"):
+        # strategy file
+        tables = Strategy.load(strategy)
+    elif strategy in Strategy.builtins:
+        # strategy chart shipped with the package
+        tables = Strategy.builtin(strategy)
     else:
         raise Exception("unknown strategy")
     
     # utility functions
     
     cards =      [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
-    deckCounts = [4, 4, 4, 4, 4, 4, 4, 4, 4, 16]
+    deckCounts = [4*opts.decks for c in range(9)] + [16*opts.decks]
+    if opts.shoe:
+        try:
+            deckCounts = [int(n) for n in opts.shoe.split(",")]
+        except ValueError:
+            optparser.error("shoe counts must be integers")
+        if len(deckCounts) != len(cards) or min(deckCounts) < 0:
+            optparser.error("shoe must have 10 non-negative counts (A,2,...,9,10)")
+    elif opts.decks < 1:
+        optparser.error("number of decks must be at least 1")
     deckCountTotal = sum(deckCounts)
-
-    # number of times card c appears in hand h
-    def cardCount(hand, c):
-        n = 0
-        for k in hand:
-            if k == c:
-                n += 1
-        return n
     
-    # hand total t,a (total is soft if a > 0)
-    def handTotal(hand):
-        t = 0
-        a = 0
-        for c in hand:
-            t += c
-            if c == 1:
-                a = 1
-        if a and t < 12:
-            t += 10
-        else:
-            a = 0
-        return t,a
-
-    # probability of drawing a card given a set of already dealt cards
-    def drawProb1(dealt, c):
-        nc = deckCounts[c-1] - cardCount(dealt, c)
-        if nc > 0:
-            return nc/(deckCountTotal-len(dealt))
-        return 0
-        
-    # probability of drawing a hand given a set of already dealt cards
-    def drawProb(dealt, hand):
-        p = 1.0
-        for i in range(len(hand)):
-            p = p*drawProb1(dealt+hand[0:i], hand[i])
-        return p
-
-    
-    dfus = cards
+    dfus = [dfu for dfu in cards if deckCounts[dfu-1] > 0]
     if opts.dfu:
         dfus = [opts.dfu]
 
+    # hot path counters and timers (only installed with --profile)
+    profile = Profile("ewcalc2.py", bool(opts.profile))
+
 
     # expand dealer partial hand
+    @profile.counted
     def expandDealerHand(h):
-        t,a = handTotal(h)
-        if t < 17:
+        if not rules.dealerStands(h.t, h.a):
             xh = []
             for k in cards:
-                if cardCount(h, k) < deckCounts[k-1]:
-                    xh += expandDealerHand(h + [k])
+                if h.canDraw(k):
+                    xh += expandDealerHand(h.draw(k))
             return xh
         return [h]
-    
 
-    def cardsRemaining(dfu, d2, s, h, k):
-        return cardCount(h, k) < deckCounts[k-1] - (1 if dfu == k else 0) - (1 if d2 == k else 0) - (1 if s == k else 0)
+    # probability of the dealer drawing the rest of dealer hand dh after player hand h is dealt
+    # (the same products as drawing the cards with Hand.drawOther, without copying the hand)
+    @profile.counted
+    def dealerDrawProb(h, dh):
+        counts = list(h.counts)
+        left = h.left
+        p = h.p
+        for k in dh.cards[2:]:
+            if counts[k-1] == 0:
+                return 0
+            p = p*(counts[k-1]/left)
+            counts[k-1] -= 1
+            left -= 1
+        return p
+
+    # rules and the calculation with dependent draws
+    #
+    # The dealer total probabilities, the player's expected winnings and the exact split values are
+    # DependentEngine's, memoized by the composition of the remaining shoe (and bounded by -c). Its
+    # dealer cache (--dealer-cache) keeps the dealer total probabilities for the dealer partial hands
+    # that are looked up directly between runs.
+    rules = Rules(das=opts.das, splitHands=opts.resplit)
+    engine = DependentEngine(rules, Shoe(deckCounts), opts.cacheSize, opts.dealerCache)
+    engine.dealerTotalProbs = profile.counted(engine.dealerTotalProbs, "dealerTotalProbs")
+    engine.playerEW = profile.counted(engine.playerEW, "playerEW")
+    engine.splitHandsEW = profile.counted(engine.splitHandsEW, "splitHandsEW")
 
-    # expand player partial hand using basic strategy
-    def expandPlayerHand(dfu, d2, s, b, h):
-        t,a = handTotal(h)
+    # expected winnings for a player standing on total t with bet b given the dealer final total probabilities
+    def ewStand(dtp, t, b):
+        w = dtp[0] # player wins b if dealer busts
+        for dt in range(17,22):
+            if dt < t:
+                # player wins b if dealer total is less than t
+                w += dtp[dt-16]
+            elif dt > t:
+                # player loses b if dealer total is greater than t
+                w -= dtp[dt-16]
+        return b*w
+
+
+    # exact rational evaluation
+    #
+    # Every probability is a product of counts nk over the number of cards left n, so from a shoe
+    # with n cards left everything can be scaled by the falling factorial S(n) = n!/nmin! and kept
+    # as an integer numerator: a draw of card k multiplies by nk and the scale drops to S(n-1).
+    # nmin is low enough that a round never reaches it (a player hand and the other half of a split
+    # take at most 23 cards out of the shoe and the dealer's hand at most 18, on top of the four
+    # dealt first). The expected winnings for a dealer face up card end up over a single
+    # denominator, 2*S(N-1) for a shoe of N cards (the 2 is for the 3:2 payout on naturals).
+    exactMin = max(0, deckCountTotal - 45)
+    exactScale = [None for n in range(exactMin)] + [math.perm(n, n-exactMin) for n in range(exactMin, deckCountTotal+1)]
+    exactDenominator = 2*exactScale[deckCountTotal-1]
+
+    # numerators over S(n) of the dealer final total probabilities (bust, 17, 18, 19, 20, 21) for a
+    # dealer partial hand with total t,a drawing from the remaining shoe counts (n cards)
+    @profile.counted
+    @functools.lru_cache(maxsize=(opts.cacheSize if opts.cacheSize > 0 else None))
+    def dealerTotalNumerators(counts, t, a):
+        n = sum(counts)
+        probs = [0 for i in range(6)]
+        if rules.dealerStands(t, a):
+            # dealer stands on the first two cards
+            probs[t-16] = exactScale[n]
+            return tuple(probs)
+        for k in cards:
+            nk = counts[k-1]
+            if nk == 0:
+                continue
+            tk,ak = addCard(t, a, k)
+            if tk > 21:
+                probs[0] += nk*exactScale[n-1] # bust
+            elif rules.dealerStands(tk, ak):
+                probs[tk-16] += nk*exactScale[n-1] # total
+            else:
+                ptk = dealerTotalNumerators(removeCard(counts, k), tk, ak)
+                for i in range(6):
+                    probs[i] += nk*ptk[i]
+        return tuple(probs)
+
+    # numerator over S(n) of standEW
+    def standEWNumerator(dt, da, counts, t):
+        if t > 21:
+            return -exactScale[sum(counts)] # player loses on bust
+        return ewStand(dealerTotalNumerators(counts, dt, da), t, 1)
+
+    # numerator over S(n) of playerEW
+    @profile.counted
+    @functools.lru_cache(maxsize=(opts.cacheSize if opts.cacheSize > 0 else None))
+    def playerEWNumerator(dfu, dt, da, counts, t, a, n2):
+        if t > 21:
+            return -exactScale[sum(counts)] # player loses on bust
+        # doubling
+        if n2 and tables.double(dfu, t, a):
+            ew = 0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    ew += nk*standEWNumerator(dt, da, removeCard(counts, k), tk)
+            return 2*ew
+        # hitting
+        if tables.hit(dfu, t, a):
+            ew = 0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    ew += nk*playerEWNumerator(dfu, dt, da, removeCard(counts, k), tk, ak, False)
+            return ew
+        return standEWNumerator(dt, da, counts, t)
+
+    # numerator over S(n) of initialEW
+    def initialEWNumerator(dfu, dh, h):
         # splitting
-        if s == 0 and len(h) == 2 and h[0] == h[1]:
-            if h[0] in Y_D(dfu):
-                if h[0] == 1:
-                    xh = []
-                    for k in cards:
-                        if cardsRemaining(dfu, d2, s, h, k):
-                            xh += [[h[0], b, h[0:1] + [k]]]
-                    return xh
+        y = h.cards[0]
+        if y == h.cards[1] and tables.split(dfu, y):
+            sh = h.split()
+            ew = 0
+            for k in cards:
+                if sh.canDraw(k):
+                    hk = sh.draw(k)
+                    nk = sh.counts[k-1]
+                    if y == 1:
+                        # split aces get one card each
+                        ew += nk*standEWNumerator(dh.t, dh.a, hk.counts, hk.t)
+                    else:
+                        ew += nk*playerEWNumerator(dfu, dh.t, dh.a, hk.counts, hk.t, hk.a, opts.das)
+            # value of a split hand is taken to be twice one half of the split
+            return 2*ew
+        return playerEWNumerator(dfu, dh.t, dh.a, h.counts, h.t, h.a, True)
+
+
+    # optimal strategy solver
+    #
+    # The expected winnings maximizing decisions are found by dynamic programming over hand states
+    # (memoized by the composition of the shoe the player draws from). They are then summarized in
+    # M(D), M*(D), X(D), Y(D) form by adding up the advantage of each decision over every hand state
+    # where it comes up, weighted by the probability of reaching that state.
+    #
+    # The player doesn't see the dealer's hole card, so it stays in the remaining shoe counts and
+    # the expected winnings are averaged over it. They only count games where the dealer doesn't
+    # have a natural (the player loses those before making any decisions), which scales all of the
+    # choices at a hand state by the same probability and leaves the best one unchanged.
+
+    # expected winnings per unit bet times the probability of no dealer natural for standing on
+    # total t with the remaining shoe counts, including the dealer's hole card
+    @profile.counted
+    @functools.lru_cache(maxsize=(opts.cacheSize if opts.cacheSize > 0 else None))
+    def standEWNoNatural(dfu, counts, t):
+        n = sum(counts)
+        ew = 0.0
+        for d2 in cards:
+            nk = counts[d2-1]
+            if nk > 0:
+                dt,da = addCard(*addCard(0, 0, dfu), d2)
+                if dt < 21: # no natural
+                    ew += nk/n*engine.standEW(dt, da, removeCard(counts, d2), t)
+        return ew
+
+    # expected winnings (as above) for standing, hitting and doubling (None where not allowed)
+    # a player partial hand with total t,a (n2 if it has two cards)
+    @profile.counted
+    @functools.lru_cache(maxsize=(opts.cacheSize if opts.cacheSize > 0 else None))
+    def actionEWs(dfu, counts, t, a, n2):
+        stand = standEWNoNatural(dfu, counts, t)
+        hit = None
+        double = None
+        if t < 21:
+            n = sum(counts)
+            hit = 0.0
+            if n2:
+                double = 0.0
+            for k in cards:
+                nk = counts[k-1]
+                if nk > 0:
+                    tk,ak = addCard(t, a, k)
+                    hit += nk/n*bestEW(dfu, removeCard(counts, k), tk, ak, False)
+                    if n2:
+                        double += 2*nk/n*standEWNoNatural(dfu, removeCard(counts, k), tk)
+        return stand, hit, double
+
+    # expected winnings (as above) for the best play of a player partial hand
+    def bestEW(dfu, counts, t, a, n2):
+        if t > 21:
+            return standEWNoNatural(dfu, counts, t) # bust
+        return max(ew for ew in actionEWs(dfu, counts, t, a, n2) if ew is not None)
+
+    # expected winnings (as above) for splitting pair hand h (twice one half of the split)
+    def splitEW(dfu, h):
+        sh = h.split()
+        ew = 0.0
+        for k in cards:
+            if sh.canDraw(k):
+                hk = sh.draw(k)
+                pk = sh.counts[k-1]/sh.left
+                if h.cards[0] == 1:
+                    # split aces get one card each
+                    ew += pk*standEWNoNatural(dfu, hk.counts, hk.t)
                 else:
-                    xh = []
-                    for k in cards:
-                        if cardsRemaining(dfu, d2, s, h, k):
-                            xh += expandPlayerHand(dfu, d2, h[0], b, h[0:1] + [k])
-                    return xh
+                    ew += pk*bestEW(dfu, hk.counts, hk.t, hk.a, opts.das)
+        return 2*ew
+
+    # solve for the optimal strategy and return it compiled like any other strategy
+    def solveStrategy():
+        standing = [[0, 0] for dfu in cards]
+        doubles = [[[], []] for dfu in cards]
+        splits = [[] for dfu in cards]
+        optimalEW = [0.0 for dfu in cards]
+        for dfu in dfus:
+            # advantage (and total weight) of hitting over standing, doubling over the best other
+            # play and splitting over not splitting by total t,a and pair card
+            hitMargins = [[0.0 for t in range(22)] for a in range(2)]
+            hitWeights = [[0.0 for t in range(22)] for a in range(2)]
+            doubleMargins = [[0.0 for t in range(22)] for a in range(2)]
+            splitMargins = [0.0 for c in cards]
+            # hand states (counts, t, a, n2) still being played, with their probabilities
+            states = {}
+            def addState(counts, t, a, n2, p):
+                states[(counts, t, a, n2)] = states.get((counts, t, a, n2), 0.0) + p
+            for i in cards:
+                for j in cards:
+                    h = Hand(deckCounts).remove(dfu)
+                    if not h.canDraw(i) or not h.draw(i).canDraw(j):
+                        continue
+                    h = h.draw(i).draw(j)
+                    # probability the dealer has a natural
+                    pdnat = 0.0
+                    for d2 in cards:
+                        if h.canDraw(d2) and addCard(*addCard(0, 0, dfu), d2)[0] == 21:
+                            pdnat += h.counts[d2-1]/h.left
+                    if h.t == 21:
+                        optimalEW[dfu-1] += h.p*rules.blackjackPays*(1-pdnat) # natural
+                        continue
+                    optimalEW[dfu-1] -= h.p*pdnat
+                    ew = bestEW(dfu, h.counts, h.t, h.a, True)
+                    if i == j:
+                        ews = splitEW(dfu, h)
+                        splitMargins[i-1] += h.p*(ews - ew)
+                        if ews > ew:
+                            optimalEW[dfu-1] += h.p*ews
+                            if i != 1:
+                                # both halves of the split are played on
+                                sh = h.split()
+                                for k in cards:
+                                    if sh.canDraw(k):
+                                        hk = sh.draw(k)
+                                        addState(hk.counts, hk.t, hk.a, True, 2*h.p*sh.counts[k-1]/sh.left)
+                            continue
+                    optimalEW[dfu-1] += h.p*ew
+                    addState(h.counts, h.t, h.a, True, h.p)
+            # follow the best play one card at a time, merging states with the same composition
+            while states:
+                nextStates = states
+                states = {}
+                for (counts, t, a, n2), p in nextStates.items():
+                    stand,hit,double = actionEWs(dfu, counts, t, a, n2)
+                    if hit is None:
+                        continue
+                    if double is not None:
+                        doubleMargins[a][t] += p*(double - max(stand, hit))
+                        if double > max(stand, hit):
+                            continue
+                    hitMargins[a][t] += p*(hit - stand)
+                    hitWeights[a][t] += p
+                    if hit > stand:
+                        n = sum(counts)
+                        for k in cards:
+                            nk = counts[k-1]
+                            if nk > 0:
+                                tk,ak = addCard(t, a, k)
+                                if tk <= 21:
+                                    addState(removeCard(counts, k), tk, ak, False, p*nk/n)
+            # stand on totals above the highest total where hitting comes out ahead
+            for a in range(2):
+                hits = [t for t in range(22) if hitWeights[a][t] > 0 and hitMargins[a][t] > 0]
+                standing[dfu-1][a] = (max(hits)+1) if hits else (12 if a else 4)
+                doubles[dfu-1][a] = [t for t in range(22) if doubleMargins[a][t] > 0]
+            splits[dfu-1] = [c for c in cards if splitMargins[c-1] > 0]
+        print("optimal strategy")
+        print("dfu M(D) M*(D) X(D)hard X(D)soft Y(D)")
+        for dfu in dfus:
+            print(dfu, standing[dfu-1][0], standing[dfu-1][1], doubles[dfu-1][0], doubles[dfu-1][1], splits[dfu-1])
+        if opts.verbose:
+            print("optimal composition dependent expected winnings")
+            ew = 0.0
+            for dfu in dfus:
+                print(dfu, optimalEW[dfu-1])
+                ew += optimalEW[dfu-1]*deckCounts[dfu-1]/deckCountTotal
+            if not opts.dfu:
+                print(ew)
+            print("solver cache", actionEWs.cache_info())
+        def M_D(dfu, a):
+            return standing[dfu-1][a]
+        def X_D(dfu, a):
+            return doubles[dfu-1][a]
+        def Y_D(dfu):
+            return splits[dfu-1]
+        return Strategy("optimal", M_D, X_D, Y_D)
+
+    if strategy == "optimal":
+        profile.phase("solver")
+        tables = solveStrategy()
+
+    # expand player partial hand using basic strategy, yielding the final hands w/bets one at a
+    # time so that memory stays flat however many hands the shoe allows
+    @profile.counted
+    def expandPlayerHand(dfu, s, b, h):
+        t,a = h.t,h.a
+        # splitting
+        if s == 0 and len(h.cards) == 2 and h.cards[0] == h.cards[1]:
+            if tables.split(dfu, h.cards[0]):
+                sh = h.split()
+                for k in cards:
+                    if sh.canDraw(k):
+                        if h.cards[0] == 1:
+                            yield h.cards[0], b, sh.draw(k)
+                        else:
+                            yield from expandPlayerHand(dfu, h.cards[0], b, sh.draw(k))
+                return
         # doubling
-        if len(h) == 2:
-            if t in X_D(dfu, a):
-                xh = []
+        if len(h.cards) == 2 and (s == 0 or opts.das):
+            if tables.double(dfu, t, a):
                 for k in cards:
-                    if cardsRemaining(dfu, d2, s, h, k):
-                        xh += [[s, b*2, h + [k]]]
-                return xh
+                    if h.canDraw(k):
+                        yield s, b*2, h.draw(k)
+                return
         # hitting
-        if t < M_D(dfu, a):
-            xh = []
+        if tables.hit(dfu, t, a):
             for k in cards:
-                if cardsRemaining(dfu, d2, s, h, k):
-                    xh += expandPlayerHand(dfu, d2, s, b, h + [k])
-            return xh
-        return [[s, b, h]]
+                if h.canDraw(k):
+                    yield from expandPlayerHand(dfu, s, b, h.draw(k))
+            return
+        yield s, b, h
 
 
-    # compute expected winnings
-    print("expected winnings by dealer face up card")
-    expectedWinnings = [0.0 for dfu in cards]
-    overallExpectedWinnings = 0.0
+    # unique dealer hands for dealer up card dfu and hole card d2
+    @profile.counted
+    @functools.lru_cache(maxsize=None)
+    def dealerHands(dfu, d2):
+        return expandDealerHand(Hand(deckCounts, [dfu, d2]))
+
+    # index of the dealer hands for dealer up card dfu and hole card d2 by the cards they draw
+    # after the hole card: a tree with one level per card value, branching on how many of that
+    # card the hand uses, with the positions of the hands in dealerHands at the leaves
+    @functools.lru_cache(maxsize=None)
+    def dealerHandIndex(dfu, d2):
+        index = {}
+        for dhi,dh in enumerate(dealerHands(dfu, d2)):
+            used = [0 for c in cards]
+            for k in dh.cards[2:]:
+                used[k-1] += 1
+            node = index
+            for n in used[:-1]:
+                node = node.setdefault(n, {})
+            node.setdefault(used[-1], []).append(dhi)
+        return index
+
+    # positions of the dealer hands in index that can still be drawn from the remaining shoe
+    # counts (whole subtrees are passed over as soon as a card value runs short)
+    def compatibleDealerHands(index, counts, i, dhis):
+        for n,node in index.items():
+            if n <= counts[i]:
+                if i+1 < len(counts):
+                    compatibleDealerHands(node, counts, i+1, dhis)
+                else:
+                    dhis += node
+        return dhis
+
+    # expected winnings and total probability for one unit of work: the games where the dealer
+    # shows dfu with hole card d2 and the player's first two cards are p1 and p2 (p2 <= p1)
+    #
+    # With --exact-split, units where the player splits also return the approximate and exact
+    # expected winnings of the split and the time taken by each. With --enumerate, units return
+    # the number of player and dealer hand pairs evaluated and skipped.
+    def evalUnit(dfu, d2, p1, p2):
+        if opts.exact:
+            return evalUnitExact(dfu, d2, p1, p2)
+        ew = 0.0
+        ptotal = 0.0
+        dh = Hand(deckCounts, [dfu, d2])
+        dnat = dh.t == 21
+        # player hand drawn after the dealer's hole card
+        ph = Hand(deckCounts).remove(dfu).drawOther(d2).draw(p1).draw(p2)
+        # initial player hands [a,b] and [b,a] are equivalent, so only analyze for b <= a and double results for b < a
+        pm = 2 if p2 < p1 else 1
+        pnat = ph.t == 21
+        if dnat:
+            # dealer has a natural
+            p = ph.p*pm
+            if not pnat:
+                # player loses their bet if they don't also have a natural
+                ew -= p
+            return ew, p, None
+        if pnat:
+            # player wins rules.blackjackPays times their bet on a natural
+            p = ph.p*pm
+            return rules.blackjackPays*p, p, None
+        # no naturals
+        if not opts.enumerate:
+            p = ph.p*pm
+            if opts.exactSplit and p1 == p2 and tables.split(dfu, p1):
+                t0 = time.perf_counter()
+                ewa = p*engine.initialEW(tables, dfu, dh.t, dh.a, ph)
+                t1 = time.perf_counter()
+                ewx = p*engine.exactSplitEW(tables, dfu, dh.t, dh.a, ph)
+                t2 = time.perf_counter()
+                return ewx, p, (ewa, ewx, t1-t0, t2-t1)
+            return p*engine.initialEW(tables, dfu, dh.t, dh.a, ph), p, None
+        dhs = dealerHands(dfu, d2)
+        index = dealerHandIndex(dfu, d2)
+        visited = 0
+        skipped = 0
+        for s,b,h in expandPlayerHand(dfu, 0, 1, ph):
+            t = h.t
+            if t > 21:
+                # player loses b on bust
+                w = -b
+                p = h.p*pm
+                ew += p*w*(2 if s > 0 else 1)
+                ptotal += p 
+                continue
+            # skip impossible hand combinations, where the dealer hand needs more of some card
+            # than the player hand leaves in the shoe (visited in the same order as dhs, so that
+            # the sums don't change)
+            dhis = sorted(compatibleDealerHands(index, h.counts, 0, []))
+            visited += len(dhis)
+            skipped += len(dhs) - len(dhis)
+            for dhi in dhis:
+                dt = dhs[dhi].t
+                p = dealerDrawProb(h, dhs[dhi])*pm
+                w = 0
+                if dt > 21:
+                    # player wins b if dealer busts
+                    w = b
+                elif dt < t:
+                    # player wins b if dealer total is less than t
+                    w = b
+                elif dt > t:
+                    # player loses b if dealer total is greater than t
+                    w = -b
+                ew += p*w*(2 if s > 0 else 1)
+                ptotal += p
+        if profile.enabled:
+            profile.count("zero probability skips", skipped)
+        return ew, ptotal, (visited, skipped)
+
+    # evalUnit with --exact, returning numerators over exactDenominator
+    def evalUnitExact(dfu, d2, p1, p2):
+        dh = Hand(deckCounts, [dfu, d2])
+        ph = Hand(deckCounts).remove(dfu).drawOther(d2).draw(p1).draw(p2)
+        # numerator of the probability of the hole card and the player's first two cards over
+        # S(N-1)/S(N-4), doubled for b < a as above
+        q = 2 if p2 < p1 else 1
+        counts = list(ph.counts)
+        for c in (p2, p1, d2):
+            counts[c-1] += 1
+            q *= counts[c-1]
+        p = 2*q*exactScale[ph.left]
+        if dh.t == 21:
+            # dealer has a natural
+            return (0 if ph.t == 21 else -p), p, None
+        if ph.t == 21:
+            # player wins 1.5 times their bet on a natural
+            return 3*q*exactScale[ph.left], p, None
+        return 2*q*initialEWNumerator(dfu, dh, ph), p, None
+
+    # units of work in a fixed order
+    units = []
     for dfu in dfus:
-        ptotal = 0
         for d2 in cards:
-            dnat = handTotal([dfu, d2])[0] == 21
-            dhs = expandDealerHand([dfu, d2])
-            # initial player hands [a,b] and [b,a] are equivalent, so only analyze for b <= a and double results for b < a
+            h = Hand(deckCounts).remove(dfu)
+            if not h.canDraw(d2):
+                continue
+            h = h.drawOther(d2)
             for p1i in range(len(cards)):
                 p1 = cards[p1i]
                 for p2i in range(p1i+1):
                     p2 = cards[p2i]
-                    pnat = handTotal([p1, p2])[0] == 21
-                    if dnat:
-                        # dealer has a natural
-                        if not pnat:
-                            # player loses b if they don't also have a natural
-                            w = -b
-                            p = drawProb([dfu], [d2, p1, p2])*(2 if p2 < p1 else 1)
-                            expectedWinnings[dfu-1] += p*w
-                            ptotal += p
-                        else:
-                            p = drawProb([dfu], [d2, p1, p2])*(2 if p2 < p1 else 1)
-                            ptotal += p
-                        continue
-                    if pnat:
-                        # player wins 1.5*b on a natural
-                        w = 1.5*b
-                        p = drawProb([dfu], [d2, p1, p2])*(2 if p2 < p1 else 1)
-                        expectedWinnings[dfu-1] += p*w
-                        ptotal += p
-                        continue
-                    # no naturals
-                    phs = expandPlayerHand(dfu, d2, 0, 1, [p1, p2])
-                    for phi in range(len(phs)):
-                        s,b,h = phs[phi]
-                        t,a = handTotal(h)
-                        if t > 21:
-                            # player loses b on bust
-                            w = -b
-                            p = drawProb([dfu], dh[1:2] + ([s] if s > 0 else []) + h)*(2 if p2 < p1 else 1)
-                            expectedWinnings[dfu-1] += p*w*(2 if s > 0 else 1)
-                            ptotal += p 
-                            continue
-                        for dhi in range(len(dhs)):
-                            dh = dhs[dhi]
-                            dt,da = handTotal(dh)
-                            p = drawProb([dfu], dh[1:2] + ([s] if s > 0 else []) + h + dh[2:])*(2 if p2 < p1 else 1)
-                            if p == 0:
-                                # skip impossible hand combinations
-                                continue
-                            w = 0
-                            if dt > 21:
-                                # player wins b if dealer busts
-                                w = b
-                            elif dt < t:
-                                # player wins b if dealer total is less than t
-                                w = b
-                            elif dt > t:
-                                # player loses b if dealer total is greater than t
-                                w = -b
-                            expectedWinnings[dfu-1] += p*w*(2 if s > 0 else 1)
-                            ptotal += p
+                    if h.canDraw(p1) and h.draw(p1).canDraw(p2):
+                        units.append((dfu, d2, p1, p2))
+
+    # evaluate the units, in a process pool if requested
+    profile.phase("units")
+    runUnit = evalUnit
+    if profile.enabled:
+        # each unit is timed by dealer face up card, and the counts come back with its result so
+        # that they aren't lost in pool workers
+        def runUnit(*unit):
+            start = time.perf_counter()
+            r = evalUnit(*unit)
+            profile.dfuTime("units", unit[0], time.perf_counter() - start)
+            return r, profile.take()
+    # with -c 0 the caches in exact split mode are dropped between dealer face up cards, so memory
+    # is capped by the heaviest card rather than all of them (few entries are shared between cards
+    # as the dealer starts from a different total)
+    def clearCaches():
+        if opts.exactSplit and opts.cacheSize == 0:
+            engine.dealerTotalProbs.cache_clear()
+            engine.playerEW.cache_clear()
+            engine.splitHandsEW.cache_clear()
+    results = {}
+    def addResult(unit, r):
+        if profile.enabled:
+            r,taken = r
+            profile.merge(taken)
+        results[unit] = r
+    if opts.jobs > 1:
+        # the units are handed out in groups sharing a dealer face up card and hole card, the
+        # heaviest face up cards first so the pool doesn't wait on one at the end (costOrder, from
+        # timing each face up card on its own for the built in strategies, single deck: a 2 takes
+        # about five times as long as a 10).
+        # Groups go out several at a time, consecutive ones sharing a face up card, so a worker's
+        # dealer and player caches stay warm for the compositions they have in common, and there are
+        # enough chunks for the workers to even out.
+        global _evalUnits
+        lastDfu = [None]
+        def evalUnits(groupUnits):
+            if groupUnits[0][0] != lastDfu[0]:
+                clearCaches()
+                lastDfu[0] = groupUnits[0][0]
+            rs = [(unit, runUnit(*unit)) for unit in groupUnits]
+            if engine.dealerCache is not None:
+                # workers keep their own dealer cache entries, so they write them out as they go
+                engine.dealerCache.flush()
+            return rs
+        _evalUnits = evalUnits
+        costOrder = [2, 3, 4, 1, 7, 5, 6, 8, 9, 10]
+        groups = {}
+        for unit in units:
+            groups.setdefault(unit[:2], []).append(unit)
+        groupUnits = sorted(groups.values(), key=lambda g: costOrder.index(g[0][0]))
+        chunksize = max(1, len(groupUnits)//(4*opts.jobs))
+        # workers start from empty counts (the parent's are added back afterwards)
+        taken = profile.take()
+        with multiprocessing.get_context("fork").Pool(opts.jobs) as pool:
+            for rs in pool.imap(evalUnitsWorker, groupUnits, chunksize=chunksize):
+                for unit, r in rs:
+                    addResult(unit, r)
+        profile.merge(taken)
+    else:
+        for i,unit in enumerate(units):
+            if i > 0 and unit[0] != units[i-1][0]:
+                clearCaches()
+            addResult(unit, runUnit(*unit))
+    profile.phase("output")
+
+    # compute expected winnings (partial results are always added up in the same order, so they
+    # don't depend on the number of jobs)
+    print("expected winnings by dealer face up card")
+    expectedWinnings = [0.0 for dfu in cards]
+    overallExpectedWinnings = 0.0
+    if opts.exact:
+        # numerators over exactDenominator until they are all added up
+        expectedWinnings = [0 for dfu in cards]
+        overallExpectedWinnings = Fraction(0)
+    splitStats = [[0.0, 0.0, 0.0, 0.0] for dfu in cards]
+    pairStats = [[0, 0] for dfu in cards]
+    for dfu in dfus:
+        ptotal = 0
+        for unit in units:
+            if unit[0] == dfu:
+                expectedWinnings[dfu-1] += results[unit][0]
+                ptotal += results[unit][1]
+                if results[unit][2] and opts.enumerate:
+                    for i in range(2):
+                        pairStats[dfu-1][i] += results[unit][2][i]
+                elif results[unit][2]:
+                    for i in range(4):
+                        splitStats[dfu-1][i] += results[unit][2][i]
+        if opts.exact:
+            expectedWinnings[dfu-1] = Fraction(expectedWinnings[dfu-1], exactDenominator)
+            ptotal = Fraction(ptotal, exactDenominator)
+            overallExpectedWinnings += expectedWinnings[dfu-1]*Fraction(deckCounts[dfu-1], deckCountTotal)
+            if opts.verbose:
+                print(dfu, float(expectedWinnings[dfu-1]), expectedWinnings[dfu-1], ptotal)
+            else:
+                print(dfu, float(expectedWinnings[dfu-1]), expectedWinnings[dfu-1])
+            continue
         if opts.verbose:
             print(dfu, expectedWinnings[dfu-1], ptotal)
         else:
@@ -293,7 +722,47 @@ def main(argv):
         overallExpectedWinnings += expectedWinnings[dfu-1]*deckCounts[dfu-1]/deckCountTotal
     if not opts.dfu:
         print("overall expected winnings")
-        print(overallExpectedWinnings)
+        if opts.exact:
+            print(float(overallExpectedWinnings), overallExpectedWinnings)
+        else:
+            print(overallExpectedWinnings)
+    if opts.exactSplit:
+        print("split expected winnings by dealer face up card (approximate, exact, difference, approximate seconds, exact seconds)")
+        for dfu in dfus:
+            ewa,ewx,ta,tx = splitStats[dfu-1]
+            print(dfu, ewa, ewx, ewx-ewa, round(ta, 3), round(tx, 3))
+    if opts.verbose and opts.enumerate:
+        print("player and dealer hand pairs by dealer face up card (visited, skipped, skip rate)")
+        for dfu in dfus:
+            visited,skipped = pairStats[dfu-1]
+            print(dfu, visited, skipped, round(skipped/max(visited+skipped, 1), 4))
+    if opts.verbose and opts.jobs <= 1 and not opts.enumerate:
+        if opts.exact:
+            print("dealer total cache", dealerTotalNumerators.cache_info())
+            print("player cache", playerEWNumerator.cache_info())
+        else:
+            print("dealer total cache", engine.dealerTotalProbs.cache_info())
+            print("player cache", engine.playerEW.cache_info())
+    if engine.dealerCache is not None:
+        if opts.verbose:
+            print("dealer cache entries loaded:",engine.dealerCache.loaded,"new:",len(engine.dealerCache.new))
+        engine.dealerCache.flush()
+    if opts.verbose:
+        print("peak memory (MB):", round(peakMemory()/2**20, 1))
+    if profile.enabled:
+        profile.save(opts.profile)
+
+# peak resident memory of the process and any child processes, in bytes
+def peakMemory():
+    return 1024*max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+# evaluator of a group of units for process pool workers (set before the pool is forked, since
+# closures can't be pickled)
+_evalUnits = None
+
+def evalUnitsWorker(units):
+    return _evalUnits(units)
 
 if __name__ == '__main__':
     main(sys.argv)
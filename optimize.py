@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import os
+import math
+import random
+import time
+
+from blackjack import cards, Rules, Shoe, Strategy, BaldwinEngine, DependentEngine
+
+
+# chart entries the search can change: standing numbers, totals to double down on, pairs to split
+hardStanding = range(12, 22)
+softStanding = range(12, 22)
+hardDoubles = range(5, 12)
+softDoubles = range(12, 21)
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [strategy]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-e", "--engine", action="store", type="string", dest="engine", default="baldwin", help="engine to evaluate strategies with: baldwin (as in baldwinpaper.py) or exact (as in ewcalc2.py) (default baldwin)")
+    optparser.add_option("-o", "--output", action="store", type="string", dest="output", default="optimized.csv", help="strategy file (.csv or .json) to save the best strategy found to (default optimized.csv)")
+    optparser.add_option("--anneal", action="store", type="int", dest="anneal", default=0, help="simulated annealing with this many random moves instead of hill climbing")
+    optparser.add_option("-T", "--temperature", action="store", type="float", dest="temperature", default=0.001, help="starting annealing temperature, in overall expected winnings (default 0.001, cooling to a thousandth of it)")
+    optparser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=None, help="random seed for --anneal")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=2000000, help="maximum number of cached dealer total distributions and player expected winnings for the exact engine (default 2000000, 0 for unlimited)")
+    optparser.add_option("-r", "--rules", action="store", type="string", dest="rules", default="", help="rules in the usual shorthand, e.g. \"H17 D10\" (see blackjack/rules.py)")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("engine:",opts.engine)
+        print("output:",opts.output)
+        print("anneal:",opts.anneal)
+        print("temperature:",opts.temperature)
+        print("seed:",opts.seed)
+        print("cacheSize:",opts.cacheSize)
+        print("rules:",opts.rules)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("args:",args)
+
+    strategy = "baldwin-optimum"
+    if len(args) > 0:
+        strategy = args.pop()
+    print("Starting strategy:",strategy)
+    try:
+        if strategy.endswith(".json") or strategy.endswith(".csv"):
+            strategy = Strategy.load(strategy)
+        else:
+            strategy = Strategy.builtin(strategy)
+        shoe = Shoe.parse(opts.shoe) if opts.shoe else Shoe.decks(opts.decks)
+        rules = Rules.parse(opts.rules)
+        if opts.engine == "baldwin":
+            engine = BaldwinEngine(rules, shoe, paper=False)
+        elif opts.engine == "exact":
+            engine = DependentEngine(rules, shoe, opts.cacheSize)
+        else:
+            raise ValueError("unknown engine "+opts.engine)
+    except ValueError as e:
+        optparser.error(str(e))
+
+    # strategy chart columns
+    #
+    # The expected winnings for each dealer face up card only depend on that card's column of the
+    # chart: (M(D), M*(D), hard doubles, soft doubles, pairs to split), with the totals and pairs
+    # sorted so a column is its own cache key. Every move changes one column, so a candidate
+    # strategy is evaluated by looking up (or working out) the expected winnings of the column
+    # that changed, and the overall value moves by that column's weight times the difference.
+    def column(strategy, dfu):
+        return (strategy.M_D(dfu, 0), strategy.M_D(dfu, 1), tuple(sorted(strategy.X_D(dfu, 0))), tuple(sorted(strategy.X_D(dfu, 1))), tuple(sorted(strategy.Y_D(dfu))))
+
+    # strategy with the given columns (for every face up card A,2,...,10)
+    def columnsStrategy(name, columns):
+        return Strategy(name, lambda dfu, a: columns[dfu-1][a], lambda dfu, a: columns[dfu-1][2+a], lambda dfu: columns[dfu-1][4])
+
+    dfus = shoe.dfus()
+    weights = [shoe.counts[dfu-1]/shoe.total for dfu in cards]
+
+    # expected winnings for dealer face up card dfu with chart column col, cached by column
+    #
+    # The engine is given a strategy with the same column for every face up card, so its own
+    # tables (which are keyed by strategy) are shared by every candidate with that column.
+    columnEWs = {}
+    stats = {"evaluations": 0, "columns": 0}
+    def columnEW(dfu, col):
+        stats["evaluations"] += 1
+        key = (dfu, col)
+        ew = columnEWs.get(key)
+        if ew is None:
+            stats["columns"] += 1
+            ew = engine.ew_D(columnsStrategy("column", [col for c in cards]), dfu)
+            columnEWs[key] = ew
+        return ew
+
+    # columns one chart entry away from col
+    def neighbours(col):
+        mh,ms,xh,xs,y = col
+        for m in (mh-1, mh+1):
+            if m in hardStanding:
+                yield (m, ms, xh, xs, y)
+        for m in (ms-1, ms+1):
+            if m in softStanding:
+                yield (mh, m, xh, xs, y)
+        for t in hardDoubles:
+            yield (mh, ms, tuple(sorted(set(xh) ^ {t})), xs, y)
+        for t in softDoubles:
+            yield (mh, ms, xh, tuple(sorted(set(xs) ^ {t})), y)
+        for c in cards:
+            yield (mh, ms, xh, xs, tuple(sorted(set(y) ^ {c})))
+
+    def overall(ews):
+        return sum(weights[dfu-1]*ews[dfu-1] for dfu in dfus)
+
+    start = time.perf_counter()
+    columns = [column(strategy, dfu) for dfu in cards]
+    ews = [columnEW(dfu, columns[dfu-1]) if dfu in dfus else 0.0 for dfu in cards]
+    startEW = overall(ews)
+    print("starting expected winnings:", startEW)
+
+    if opts.anneal > 0:
+        # simulated annealing: random moves, taking the ones that lose expected winnings with a
+        # probability that falls as the temperature cools geometrically, keeping the best seen
+        rng = random.Random(opts.seed)
+        best = (startEW, list(columns), list(ews))
+        current = startEW
+        for step in range(opts.anneal):
+            temperature = opts.temperature*0.001**(step/opts.anneal)
+            dfu = rng.choice(dfus)
+            col = rng.choice(list(neighbours(columns[dfu-1])))
+            ew = columnEW(dfu, col)
+            delta = weights[dfu-1]*(ew - ews[dfu-1])
+            if delta > 0 or rng.random() < math.exp(delta/temperature):
+                columns[dfu-1] = col
+                ews[dfu-1] = ew
+                current += delta
+                if current > best[0]:
+                    best = (current, list(columns), list(ews))
+                    if opts.verbose:
+                        print("step", step, "dfu", dfu, col, "overall", current)
+        columns,ews = best[1],best[2]
+    else:
+        # hill climbing: take any move that improves a column until none does
+        improved = True
+        while improved:
+            improved = False
+            for dfu in dfus:
+                for col in neighbours(columns[dfu-1]):
+                    ew = columnEW(dfu, col)
+                    if ew > ews[dfu-1]:
+                        columns[dfu-1] = col
+                        ews[dfu-1] = ew
+                        improved = True
+                        if opts.verbose:
+                            print("dfu", dfu, col, "overall", overall(ews))
+                        break
+    seconds = time.perf_counter() - start
+
+    best = columnsStrategy(os.path.splitext(os.path.basename(opts.output))[0], columns)
+    best.save(opts.output)
+    print("expected winnings by dealer face up card")
+    for dfu in dfus:
+        print(dfu, ews[dfu-1])
+    print("overall expected winnings")
+    print(overall(ews))
+    print("strategy saved to", opts.output)
+    print("dfu M(D) M*(D) X(D)hard X(D)soft Y(D)")
+    for dfu in dfus:
+        print(dfu, *[list(x) if isinstance(x, tuple) else x for x in columns[dfu-1]])
+    print("evaluations:", stats["evaluations"], "columns evaluated:", stats["columns"], "seconds:", round(seconds, 3))
+    print("evaluations per second:", round(stats["evaluations"]/seconds, 1))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
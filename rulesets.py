@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import time
+
+from blackjack import cards, Rules, Shoe, Strategy, DependentEngine
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [rules ...]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-s", "--strategy", action="store", type="string", dest="strategy", default="baldwin-optimum", help="strategy name or file to evaluate (default baldwin-optimum)")
+    optparser.add_option("-f", "--file", action="store", type="string", dest="file", default="", help="file of rule sets, one per line (# for comments), evaluated after any given as arguments")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=0, help="maximum number of cached dealer total distributions and player expected winnings per engine (default 0 for unlimited)")
+    optparser.add_option("--dealer-cache", action="store", type="string", dest="dealerCache", default="", help="SQLite file to keep dealer total probabilities in between runs (default none)")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("strategy:",opts.strategy)
+        print("file:",opts.file)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("cacheSize:",opts.cacheSize)
+        print("dealerCache:",opts.dealerCache)
+        print("args:",args)
+
+    specs = list(args)
+    if opts.file:
+        with open(opts.file) as f:
+            for line in f:
+                line = line.split("#")[0].strip()
+                if line:
+                    specs.append(line)
+    if not specs:
+        specs = [""]
+
+    print("Using strategy:",opts.strategy)
+    try:
+        if opts.strategy.endswith(".json") or opts.strategy.endswith(".csv"):
+            strategy = Strategy.load(opts.strategy)
+        else:
+            strategy = Strategy.builtin(opts.strategy)
+        shoe = Shoe.parse(opts.shoe) if opts.shoe else Shoe.decks(opts.decks)
+        rulesets = [Rules.parse(spec) for spec in specs]
+    except ValueError as e:
+        optparser.error(str(e))
+
+    # expected winnings for each rule set
+    #
+    # There is one engine for each way of playing the hands (Rules.play), made from an engine with
+    # the same dealer rules where there is one so that they share the dealer tables. Rule sets that
+    # only pay naturals differently share an engine, and re-weight its outcomes.
+    engines = {}
+    width = max(len(str(rules)) for rules in rulesets)
+    print("expected winnings by rules")
+    for rules in rulesets:
+        start = time.perf_counter()
+        engine = engines.get(rules.play())
+        if engine is None:
+            dealerEngines = [e for e in engines.values() if e.rules.dealer == rules.dealer]
+            if dealerEngines:
+                engine = dealerEngines[0].forRules(rules)
+            else:
+                engine = DependentEngine(rules, shoe, opts.cacheSize, opts.dealerCache)
+            engines[rules.play()] = engine
+        else:
+            engine = engine.forRules(rules)
+        evaluation = engine.evaluate(strategy)
+        print(str(rules).ljust(width), evaluation.overall)
+        if opts.verbose:
+            print("expected winnings by dealer face up card")
+            for dfu in shoe.dfus():
+                print(dfu, evaluation.byDfu[dfu-1])
+            print("seconds:", round(time.perf_counter() - start, 3))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+import sys
+from optparse import OptionParser
+
+import math
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from blackjack.rules import Rules
+from blackjack.strategy import Strategy
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] strategy")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-d", "--dfu", action="store", type="int", dest="dfu", default=0, help="dealer face up card to report (default all)")
+    optparser.add_option("-r", "--rounds", action="store", type="int", dest="rounds", default=1000000, help="number of rounds to simulate (default 1000000)")
+    optparser.add_option("-b", "--batch", action="store", type="int", dest="batch", default=20000, help="number of shoes dealt side by side in each batch (default 20000)")
+    optparser.add_option("--reshuffle", action="store", type="int", dest="reshuffle", default=0, help="reshuffle before a round when this many cards or fewer are left in the shoe (default 0 reshuffles before every round)")
+    optparser.add_option("--no-das", action="store_false", dest="das", default=True, help="don't allow doubling down after splitting a pair")
+    optparser.add_option("--blackjack-pays", action="store", type="float", dest="blackjackPays", default=1.5, help="amount won per unit bet on a player natural (default 1.5)")
+    optparser.add_option("--rules", action="store", type="string", dest="rules", default="", help="other rules in the usual shorthand, e.g. \"H17 D10 ENHC\" (see blackjack/rules.py, surrender and resplitting aren't simulated)")
+    optparser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=None, help="random number generator seed")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
+    (opts, args) = optparser.parse_args()
+
+    if np is None:
+        optparser.error("simulation requires numpy")
+    if opts.rounds < 1 or opts.batch < 1:
+        optparser.error("rounds and batch must be at least 1")
+    try:
+        rules = Rules.parse(opts.rules, Rules(blackjackPays=opts.blackjackPays, das=opts.das))
+    except ValueError as e:
+        optparser.error(str(e))
+    if rules.surrender or rules.splitHands > 2:
+        # the strategy charts have no surrender decisions, and a split is played as two hands
+        optparser.error("surrender and resplitting aren't simulated")
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("dfu:",opts.dfu)
+        print("rounds:",opts.rounds)
+        print("batch:",opts.batch)
+        print("reshuffle:",opts.reshuffle)
+        print("das:",opts.das)
+        print("blackjackPays:",opts.blackjackPays)
+        print("rules:",opts.rules)
+        print("seed:",opts.seed)
+        print("args:",args)
+        
+    strategy = "baldwin-optimum"
+    if len(args) > 0:
+        strategy = args.pop()
+    print("Using strategy:",strategy)
+
+    # compiled strategy tables
+    if strategy.endswith(".json") or strategy.endswith(".csv"):
+        # strategy file
+        tables = Strategy.load(strategy)
+    elif strategy in Strategy.builtins:
+        # strategy chart shipped with the package
+        tables = Strategy.builtin(strategy)
+    else:
+        raise Exception("unknown strategy")
+    
+    # utility functions
+    
+    cards =      [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+    deckCounts = [4*opts.decks for c in range(9)] + [16*opts.decks]
+    if opts.shoe:
+        try:
+            deckCounts = [int(n) for n in opts.shoe.split(",")]
+        except ValueError:
+            optparser.error("shoe counts must be integers")
+        if len(deckCounts) != len(cards) or min(deckCounts) < 0:
+            optparser.error("shoe must have 10 non-negative counts (A,2,...,9,10)")
+    elif opts.decks < 1:
+        optparser.error("number of decks must be at least 1")
+    deckCountTotal = sum(deckCounts)
+    if deckCountTotal < 4:
+        optparser.error("shoe must have at least 4 cards")
+    
+    dfus = [dfu for dfu in cards if deckCounts[dfu-1] > 0]
+    if opts.dfu:
+        dfus = [opts.dfu]
+
+    # strategy lookup tables
+    #
+    # The compiled strategy is copied once into arrays so that every decision in a batch is
+    # a single indexing operation. Totals run past 21 so that busted hands can be looked up too.
+    #
+    # standTable[dfu,a]: total to stand on (M(D) hard, M*(D) soft)
+    # doubleTable[dfu,a,t]: true if total t,a is doubled (X(D), where the rules allow it)
+    # splitTable[dfu,c]: true if a pair of c's is split (Y(D))
+    standTable = np.zeros((11, 2), dtype=np.int8)
+    doubleTable = np.zeros((11, 2, 32), dtype=bool)
+    splitTable = np.zeros((11, 11), dtype=bool)
+    for dfu in cards:
+        for a in range(2):
+            standTable[dfu,a] = tables.M_D(dfu, a)
+            for t in range(32):
+                doubleTable[dfu,a,t] = tables.double(dfu, t, a) and rules.canDouble(t, a)
+        for c in cards:
+            splitTable[dfu,c] = tables.split(dfu, c)
+
+    # shoes
+    #
+    # Each row of shoes is a shoe and pos holds the position of the next card to be dealt from it.
+    # Every batch deals one round from each row, so the Python loops below run once per draw and
+    # each step handles the whole batch with array operations.
+    #
+    # The shoes are shuffled as they are dealt (a Fisher-Yates shuffle one card at a time): the
+    # next card is swapped in from a random position among the cards not yet dealt. That deals
+    # every card left with the same chance, like dealing from a shuffled shoe, so a reshuffle is
+    # just moving back to the top of the shoe, and only the cards a round uses are shuffled.
+
+    rng = np.random.default_rng(opts.seed)
+    shoe = np.repeat(np.array(cards, dtype=np.int8), deckCounts)
+    batch = min(opts.batch, opts.rounds)
+    shoes = np.tile(shoe, (batch, 1))
+    pos = np.full(batch, deckCountTotal)
+    rows = np.arange(batch)
+
+    # next card from each row where mask is true (every row if mask is None), 0 for the other rows
+    #
+    # If a shoe runs out in the middle of a round the next card is dealt from the whole shoe
+    # again, which only happens with a reshuffle point too small for the round being played.
+    def draw(mask=None):
+        i = rows if mask is None else np.flatnonzero(mask)
+        p = pos[i] % deckCountTotal
+        j = p + (rng.random(len(i))*(deckCountTotal - p)).astype(np.intp)
+        dealt = shoes[i, j]
+        shoes[i, j] = shoes[i, p]
+        shoes[i, p] = dealt
+        pos[i] = p + 1
+        if mask is None:
+            return dealt
+        c = np.zeros(batch, dtype=np.int8)
+        c[i] = dealt
+        return c
+
+    # hand totals for hard totals ht (aces counted as 1) and hands holding an ace, with a = 1 if
+    # the total is soft
+    def handTotals(ht, ace):
+        soft = ace & (ht <= 11)
+        return ht + 10*soft, soft.astype(np.int8)
+
+    # play out the hands in mask with hard totals ht, holding an ace, with n cards (1 for the hands
+    # of a split pair still waiting for their second card), against dealer face up card dfu
+    #
+    # Returns the hand totals and bets.
+    def playHands(mask, dfu, ht, ace, n, split):
+        ht = ht.copy()
+        ace = ace.copy()
+        # split aces get one card each
+        done = split & (ht == 1)
+        # second card for split hands
+        c = draw(mask & (n == 1))
+        ht += c
+        ace |= c == 1
+        t,a = handTotals(ht, ace)
+        # doubling
+        double = mask & ~done & doubleTable[dfu,a,t]
+        if not rules.das:
+            double &= ~split
+        c = draw(double)
+        ht += c
+        ace |= c == 1
+        # hitting
+        hit = mask & ~done & ~double
+        while True:
+            t,a = handTotals(ht, ace)
+            hit &= t < standTable[dfu,a]
+            if not hit.any():
+                break
+            c = draw(hit)
+            ht += c
+            ace |= c == 1
+        t,a = handTotals(ht, ace)
+        return t, 1 + double
+
+    # winnings for player hands with totals pt and bets b against dealer totals dt
+    def settle(pt, b, dt):
+        return b*np.where(pt > 21, -1, np.where(dt > 21, 1, np.sign(pt - dt)))
+
+    # winnings from one round dealt from each shoe, with the dealer face up cards
+    def playRound():
+        # reshuffle
+        if opts.reshuffle == 0:
+            pos[:] = 0
+        else:
+            pos[deckCountTotal - pos <= opts.reshuffle] = 0
+        # deal dealer face up card, dealer hole card, and player's first two cards
+        dfu = draw()
+        d2 = draw()
+        p1 = draw()
+        p2 = draw()
+        dnat = ((dfu == 1) & (d2 == 10)) | ((dfu == 10) & (d2 == 1))
+        pnat = ((p1 == 1) & (p2 == 10)) | ((p1 == 10) & (p2 == 1))
+        # naturals
+        # player wins rules.blackjackPays times their bet on a natural, and loses their bet to a
+        # dealer natural unless they also have one (with no hole card the player plays their hand
+        # out first, and loses every bet they made)
+        w = np.where(dnat, np.where(pnat | (not rules.holeCard), 0.0, -1.0), np.where(pnat, rules.blackjackPays, 0.0))
+        play = ~pnat & ~(dnat & rules.holeCard)
+        # splitting
+        split = play & (p1 == p2) & splitTable[dfu,p1]
+        ht = np.where(split, p1, p1 + p2).astype(np.int16)
+        ace = (p1 == 1) | (~split & (p2 == 1))
+        n = np.where(split, 1, 2)
+        pt1,b1 = playHands(play, dfu, ht, ace, n, split)
+        pt2,b2 = playHands(split, dfu, p1.astype(np.int16), p1 == 1, np.ones(batch, dtype=np.int8), split)
+        # dealer draws until the rules have the dealer stand
+        dht = (dfu + d2).astype(np.int16)
+        dace = (dfu == 1) | (d2 == 1)
+        hit = play & ~dnat
+        while True:
+            dt,da = handTotals(dht, dace)
+            stands = dt >= 17
+            if rules.hitSoft17:
+                stands &= (dt > 17) | (da == 0)
+            hit &= ~stands
+            if not hit.any():
+                break
+            c = draw(hit)
+            dht += c
+            dace |= c == 1
+        # a dealer natural (with no hole card) beats every hand the player played out
+        w += np.where(play, np.where(dnat, -b1, settle(pt1, b1, dt)), 0)
+        w += np.where(split, np.where(dnat, -b2, settle(pt2, b2, dt)), 0)
+        return w, dfu
+
+    # simulate
+    #
+    # Winnings are accumulated by dealer face up card as sums and sums of squares, for the means
+    # and their 95% confidence intervals.
+
+    n = np.zeros(11)
+    sw = np.zeros(11)
+    sw2 = np.zeros(11)
+    rounds = 0
+    start = time.perf_counter()
+    while rounds < opts.rounds:
+        w,dfu = playRound()
+        m = min(batch, opts.rounds - rounds)
+        w,dfu = w[:m],dfu[:m]
+        n += np.bincount(dfu, minlength=11)
+        sw += np.bincount(dfu, weights=w, minlength=11)
+        sw2 += np.bincount(dfu, weights=w*w, minlength=11)
+        rounds += m
+    elapsed = time.perf_counter() - start
+
+    # expected winnings and 95% confidence interval half width for rounds summed to sw, sw2 over n
+    def meanCI(n, sw, sw2):
+        if n == 0:
+            return math.nan, math.nan
+        mean = sw/n
+        var = max(sw2/n - mean*mean, 0.0)
+        return mean, 1.96*math.sqrt(var/n)
+
+    print("expected winnings by dealer face up card (with 95% confidence interval)")
+    for dfu in dfus:
+        ew,ci = meanCI(n[dfu], sw[dfu], sw2[dfu])
+        if opts.verbose:
+            print(dfu, ew, ci, int(n[dfu]))
+        else:
+            print(dfu, ew, ci)
+    if not opts.dfu:
+        print("overall expected winnings")
+        ew,ci = meanCI(n.sum(), sw.sum(), sw2.sum())
+        print(ew, ci)
+    if opts.verbose:
+        print("rounds:",rounds)
+        print("seconds:",round(elapsed, 3))
+        print("rounds per second:",round(rounds/elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
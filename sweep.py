@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#coding: utf-8
+
+#
+# MIT License
+#
+# Copyright (c) 2025 Greg Whitehead
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+
+import sys
+from optparse import OptionParser
+
+import multiprocessing
+import random
+import json
+import time
+
+from blackjack import cards, Rules, Shoe, Strategy, DependentEngine
+
+
+def main(argv):
+    optparser = OptionParser("usage: %prog [options] [strategy]")
+    optparser.add_option("-v", action="store_true", dest="verbose", default=False, help="verbose output")
+    optparser.add_option("-l", "--left", action="store", type="int", dest="left", default=0, help="number of cards left in the shoe (default half the shoe)")
+    optparser.add_option("-t", "--tens", action="store", type="string", dest="tens", default="", help="range of tens left as min,max (default every number reachable with --left cards)")
+    optparser.add_option("--sample", action="store", type="int", dest="sample", default=0, help="evaluate this many randomly dealt compositions with --left cards instead of the ten count grid")
+    optparser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=None, help="random seed for --sample")
+    optparser.add_option("-o", "--output", action="store", type="string", dest="output", default="sweep.json", help="file to write the results to, one column per line (default sweep.json)")
+    optparser.add_option("-c", "--cache-size", action="store", type="int", dest="cacheSize", default=2000000, help="maximum number of cached dealer total distributions and player expected winnings per process (default 2000000, 0 for unlimited)")
+    optparser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1, help="number of worker processes (default 1)")
+    optparser.add_option("--no-das", action="store_false", dest="das", default=True, help="don't allow doubling down after splitting a pair")
+    optparser.add_option("--blackjack-pays", action="store", type="float", dest="blackjackPays", default=1.5, help="amount won per unit bet on a player natural (default 1.5)")
+    optparser.add_option("-r", "--rules", action="store", type="string", dest="rules", default="", help="other rules in the usual shorthand, e.g. \"H17 LS SP4\" (see blackjack/rules.py)")
+    optparser.add_option("-n", "--decks", action="store", type="int", dest="decks", default=1, help="number of decks in the shoe (default 1)")
+    optparser.add_option("--shoe", action="store", type="string", dest="shoe", default="", help="shoe composition as comma separated counts of A,2,...,9,10 (overrides --decks)")
+    (opts, args) = optparser.parse_args()
+
+    if opts.verbose:
+        print("verbose:",opts.verbose)
+        print("decks:",opts.decks)
+        print("shoe:",opts.shoe)
+        print("left:",opts.left)
+        print("tens:",opts.tens)
+        print("sample:",opts.sample)
+        print("seed:",opts.seed)
+        print("output:",opts.output)
+        print("cacheSize:",opts.cacheSize)
+        print("jobs:",opts.jobs)
+        print("das:",opts.das)
+        print("blackjackPays:",opts.blackjackPays)
+        print("rules:",opts.rules)
+        print("args:",args)
+
+    strategy = "baldwin-optimum"
+    if len(args) > 0:
+        strategy = args.pop()
+    print("Using strategy:",strategy)
+    try:
+        if strategy.endswith(".json") or strategy.endswith(".csv"):
+            strategy = Strategy.load(strategy)
+        else:
+            strategy = Strategy.builtin(strategy)
+        shoe = Shoe.parse(opts.shoe) if opts.shoe else Shoe.decks(opts.decks)
+        rules = Rules.parse(opts.rules, Rules(blackjackPays=opts.blackjackPays, das=opts.das))
+    except ValueError as e:
+        optparser.error(str(e))
+    if opts.verbose:
+        print("Using rules:",rules)
+
+    left = opts.left if opts.left else shoe.total//2
+    tens = shoe.counts[9]
+    others = shoe.total - tens
+    if left < 4 or left > shoe.total:
+        optparser.error("cards left must be between 4 and the number of cards in the shoe")
+
+    # depleted compositions to evaluate
+    #
+    # The ten count grid keeps every number of tens that can be left with --left cards, and splits
+    # the rest among the other ranks in proportion to the full shoe (largest remainders first), as
+    # in Thorp's ten count tables. A sample instead deals random compositions from the shoe.
+    def othersLeft(n):
+        if n == 0:
+            # every other card is dealt (always the case for a shoe of nothing but tens)
+            return [0 for c in cards[:9]]
+        share = [shoe.counts[c-1]*n/others for c in cards[:9]]
+        counts = [int(s) for s in share]
+        for c in sorted(cards[:9], key=lambda c: counts[c-1] - share[c-1])[:n - sum(counts)]:
+            counts[c-1] += 1
+        return counts
+
+    compositions = set()
+    if opts.sample:
+        rng = random.Random(opts.seed)
+        deck = [c for c in cards for i in range(shoe.counts[c-1])]
+        for i in range(opts.sample):
+            dealt = rng.sample(deck, left)
+            compositions.add(tuple(dealt.count(c) for c in cards))
+    else:
+        tmin,tmax = max(0, left - others), min(tens, left)
+        if opts.tens:
+            try:
+                tmin,tmax = [max(tmin, int(opts.tens.split(",")[0])), min(tmax, int(opts.tens.split(",")[1]))]
+            except (ValueError, IndexError):
+                optparser.error("tens must be given as min,max")
+        for t in range(tmin, tmax+1):
+            compositions.add(tuple(othersLeft(left - t) + [t]))
+    # neighbouring compositions share the most tables, so they are evaluated one after the other
+    compositions = sorted(compositions, key=lambda counts: (counts[9], counts))
+    print("compositions:", len(compositions))
+
+    # expected winnings by dealer face up card and overall for shoe counts (every composition is
+    # evaluated by one engine per process, so the tables it reaches in common with the compositions
+    # before it are reused)
+    engine = DependentEngine(rules, shoe, opts.cacheSize)
+    def evalComposition(counts):
+        start = time.perf_counter()
+        evaluation = engine.forShoe(Shoe(counts)).evaluate(strategy)
+        return evaluation.byDfu, evaluation.overall, time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = {}
+    def addResult(counts, r):
+        results[counts] = r
+        if opts.verbose:
+            print(len(results), ",".join(str(n) for n in counts), r[1], round(r[2], 3))
+    if opts.jobs > 1:
+        global _evalComposition
+        _evalComposition = evalComposition
+        chunksize = max(1, len(compositions)//(4*opts.jobs))
+        with multiprocessing.get_context("fork").Pool(opts.jobs) as pool:
+            for counts, r in pool.imap_unordered(evalCompositionWorker, compositions, chunksize=chunksize):
+                addResult(counts, r)
+    else:
+        for counts in compositions:
+            addResult(counts, evalComposition(counts))
+    seconds = time.perf_counter() - start
+
+    # columnar output: the sweep settings, then one line per column with a value per composition
+    columns = {}
+    for c in cards:
+        columns["count%d" % c] = [counts[c-1] for counts in compositions]
+    for dfu in cards:
+        columns["ew%d" % dfu] = [results[counts][0][dfu-1] for counts in compositions]
+    columns["overall"] = [results[counts][1] for counts in compositions]
+    settings = {"strategy": strategy.name, "rules": repr(rules), "shoe": list(shoe.counts), "left": left}
+    with open(opts.output, "w") as f:
+        f.write("{\n" + ",\n".join(" " + json.dumps(k) + ": " + json.dumps(v) for k,v in list(settings.items()) + list(columns.items())) + "\n}\n")
+
+    print("expected winnings by composition (tens left, other cards left per ten)")
+    for counts in compositions:
+        t = counts[9]
+        print(t, round((left - t)/t, 3) if t else "inf", results[counts][1])
+    print("seconds:", round(seconds, 3), "per composition:", round(seconds/len(compositions), 3))
+
+
+# composition evaluator for process pool workers (set before the pool is forked, since closures can't be pickled)
+_evalComposition = None
+
+def evalCompositionWorker(counts):
+    return counts, _evalComposition(counts)
+
+if __name__ == '__main__':
+    main(sys.argv)